@@ -1,11 +1,134 @@
+# pandas, numpy, torch and readline are imported by the functions that need them,
+# so importing this module to tokenize or read metadata stays cheap
+from __future__ import annotations
+
 import os
 import re
-import readline
-import pandas as pd
+import json
 import pickle
 from dataclasses import dataclass
+from typing import TYPE_CHECKING
 
 from log import logger
+from metrics import metrics
+
+if TYPE_CHECKING:
+    import pandas as pd
+    import torch
+
+TOKEN_PATTERN = re.compile(' |/|-')
+
+# version of the raw training set written by ModelData.save_data
+DATA_FORMAT_VERSION = 1
+
+# smallest shard worth sending to another process
+MIN_ROWS_PER_PROCESS = 10000
+
+
+def tokenize(description: str) -> list[str]:
+    """Split a description into words on spaces, slashes and dashes."""
+    return TOKEN_PATTERN.split(description)
+
+
+def normalize_description(description: str) -> str:
+    """Upper-case a description and collapse repeated spaces, neither of which changes its features."""
+    return ' '.join(word for word in description.upper().split(' ') if word)
+
+
+def is_keyword(word: str) -> bool:
+    """Return whether a word can be a feature: two characters or more and not a number like 1234 or #1234."""
+    return len(word) >= 2 and not word.replace('#', '').isnumeric()
+
+
+def featurize_rows(descriptions, word_index: dict[str, int]) -> tuple[list[int], list[int]]:
+    """
+    Map each description to the sorted columns of the words it contains
+
+    Returns: crow_indices (list), col_indices (list) in CSR layout"""
+    crow_indices = [0]
+    col_indices = []
+    for description in descriptions:
+        columns = set()
+        for word in tokenize(description):
+            column = word_index.get(word.upper())
+            if column is not None:
+                columns.add(column)
+        col_indices.extend(sorted(columns))
+        crow_indices.append(len(col_indices))
+    return crow_indices, col_indices
+
+
+def count_words(descriptions) -> dict[str, int]:
+    """
+    Count the candidate keywords of each description, in order of first appearance
+
+    Returns: word_counts (dict)"""
+    word_counts = {}
+    for description in descriptions:
+        words = tokenize(description)[:-2]
+        for word in words:
+            if is_keyword(word):
+                if word not in word_counts:
+                    word_counts[word] = 1
+                else:
+                    word_counts[word] += 1
+    return word_counts
+
+
+def merge_word_counts(partial_counts) -> dict[str, int]:
+    """
+    Sum word counts of consecutive shards, keeping the order of first appearance
+
+    Returns: word_counts (dict)"""
+    word_counts = {}
+    for counts in partial_counts:
+        for word, count in counts.items():
+            word_counts[word] = word_counts.get(word, 0) + count
+    return word_counts
+
+
+def split_shards(items: list, processes: int) -> list[list]:
+    """
+    Split items into at most processes contiguous shards of at least MIN_ROWS_PER_PROCESS items
+
+    Returns: shards (list)"""
+    shards = max(1, min(processes, len(items) // MIN_ROWS_PER_PROCESS))
+    if shards == 1:
+        return [items]
+    size = -(-len(items) // shards)
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+_worker_word_index = None
+
+def _init_featurize_worker(word_index: dict[str, int]):
+    global _worker_word_index
+    _worker_word_index = word_index
+
+def _featurize_shard(descriptions) -> tuple[list[int], list[int]]:
+    return featurize_rows(descriptions, _worker_word_index)
+
+
+def parallel_featurize_rows(descriptions: list, word_index: dict[str, int], processes: int) -> tuple[list[int], list[int]]:
+    """
+    featurize_rows over shards of descriptions in a process pool
+
+    Returns: crow_indices (list), col_indices (list) in CSR layout, identical to featurize_rows"""
+    from concurrent.futures import ProcessPoolExecutor
+
+    shards = split_shards(descriptions, processes)
+    if len(shards) == 1:
+        return featurize_rows(descriptions, word_index)
+
+    crow_indices = [0]
+    col_indices = []
+    with ProcessPoolExecutor(len(shards), initializer=_init_featurize_worker, initargs=(word_index,)) as executor:
+        for shard_crow_indices, shard_col_indices in executor.map(_featurize_shard, shards):
+            offset = len(col_indices)
+            crow_indices.extend(index + offset for index in shard_crow_indices[1:])
+            col_indices.extend(shard_col_indices)
+    return crow_indices, col_indices
+
 
 @dataclass
 class LabelData:
@@ -25,43 +148,55 @@ class OneHotData:
     y: pd.DataFrame
 
 
-def classify_data(data: list[str]) -> LabelData:
+def classify_data(data: list[str], classifier=None, near_duplicates: bool = False) -> LabelData:
     """classify_data function
+
+    Each distinct description is asked about once and its label applied to every repeat;
+    given a classifier, the descriptions it is least sure about are asked first. With
+    near_duplicates, descriptions that differ only by store number or city count as repeats.
     """
+    import readline
+    import pandas as pd
+    from completion import CompletionIndex
+    from labeling_queue import LabelingQueue
+
     X = pd.Series(data)
     y = pd.Series(['']*len(X))
-    y_unique = []
+    y_unique = CompletionIndex()
 
     # set up auto complete
-    def complete(text,state):
-        vocab = y_unique
-        results = [x for x in vocab if x.lower().startswith(text.lower())] + [None]
-        return results[state]
     readline.parse_and_bind("tab: complete")
-    readline.set_completer(complete)
+    readline.set_completer(y_unique.completer())
 
     # classify data
-    for index, entry in enumerate(X):
+    if near_duplicates:
+        from near_duplicates import cluster_key
+        queue = LabelingQueue(list(X), classifier, key=cluster_key(list(X)))
+    else:
+        queue = LabelingQueue(list(X), classifier)
+    while queue.current() is not None:
         # prompt the user for a class name
-        class_name = input(f'Classify "{entry}" as: ')
+        class_name = input(f'Classify "{queue.current_description()}" as: ')
         if class_name == '':
             class_name = 'Other'
         if class_name == 'q':
             break
-        y[index] = class_name
+        for index in queue.label(class_name):
+            y[index] = class_name
 
         # add the class name to the list of class names
-        if class_name not in y_unique:
-            y_unique.append(class_name)
+        y_unique.add(class_name)
 
     return LabelData(X, y)
 
 def data_to_one_hot(data: LabelData) -> OneHotData:
     """data_to_one_hot function
     """
+    import pandas as pd
+
     freq_map = {}
     for line in data.X:
-        words = re.split(' |/|-', line)
+        words = tokenize(line)
         for word in words:
             if word in freq_map and not word.isnumeric():
                 freq_map[word] += 1
@@ -74,28 +209,68 @@ def data_to_one_hot(data: LabelData) -> OneHotData:
     X_keys = pd.Series(list(freq_map.keys()))
     y_keys = pd.Series(data.y.unique())
 
-    X = data.X.apply(lambda x: pd.Series([1 if word in re.split(' |/|-', x) else 0 for word in X_keys]))
+    X = data.X.apply(lambda x: pd.Series([1 if word in tokenize(x) else 0 for word in X_keys]))
     y = data.y.apply(lambda x: pd.Series([1 if word == x else 0 for word in y_keys]))
 
     return OneHotData(X_keys, y_keys, X, y)
 
+class LabelIndex:
+    """A hash index from normalized descriptions to the class a person labeled them with.
+    The most recent label of a description wins, so corrections replace earlier answers."""
+
+    def __init__(self, labels: dict[str, str] = None):
+        self.labels = dict(labels or {})
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def __contains__(self, description: str) -> bool:
+        return normalize_description(description) in self.labels
+
+    def add(self, description: str, label: str):
+        """Index the label of one description."""
+        self.labels[normalize_description(description)] = label
+
+    def update(self, labeled_descriptions):
+        """Index (description, label) pairs, skipping unlabeled descriptions."""
+        for description, label in labeled_descriptions:
+            if isinstance(label, str) and label:
+                self.add(description, label)
+
+    def get(self, description: str) -> str | None:
+        """Return the label of description, or None if it has not been labeled."""
+        return self.labels.get(normalize_description(description))
+
+
 class ModelData:
-    def __init__(self, raw_data: pd.DataFrame = None, data_path: str = None, meta_path: str = None):
+    def __init__(self, raw_data: pd.DataFrame = None, data_path: str = None, meta_path: str = None, processes: int = 1,
+                 featurizer=None, near_duplicates: bool = False):
         self.raw_data = raw_data
+        # building the word list and featurizing use a process pool when processes > 1
+        self.processes = processes
+        self.label_index = LabelIndex()
+        # a featurizer such as HashingFeaturizer replaces the word list
+        self.featurizer = featurizer
+        # label near-duplicate descriptions together and fill in unlabeled rows from their cluster
+        self.near_duplicates = near_duplicates
 
         if self.raw_data is not None:
-            self.word_list = self.create_word_list()
+            self.word_list = [] if self.featurizer else self.create_word_list()
             # if self.raw_data has column 'Class', then it is training data
             if 'Class' in self.raw_data.columns:
-                self.class_names = self.raw_data['Class'].unique()
+                if self.near_duplicates:
+                    self.propagate_labels()
+                    self.drop_unlabeled()
+                self.class_names = list(self.raw_data['Class'].unique())
             else:
                 self.class_names = []
                 self.classify_data()
+            self.label_index.update(zip(self.raw_data['Description'], self.raw_data['Class']))
             
             assert self.preprocess_data()
 
             self.save_meta_data('meta_data.pkl')
-            self.save_data('data.csv')
+            self.save_data('data.bin')
         elif data_path and meta_path:
             assert self.load_data(data_path)
             self.word_list, self.class_names = self.load_meta_data(meta_path)
@@ -106,6 +281,26 @@ class ModelData:
             self.word_list = None
             self.class_names = None
 
+    @property
+    def word_list(self):
+        return self._word_list
+
+    @word_list.setter
+    def word_list(self, word_list):
+        # keep a word -> column index alongside the list so lookups are O(1)
+        self._word_list = word_list
+        self.word_index = None
+        if word_list is not None:
+            self.word_index = {}
+            for index, word in enumerate(word_list):
+                self.word_index.setdefault(word, index)
+
+    @property
+    def input_size(self) -> int:
+        """The number of feature columns."""
+        if self.featurizer is not None:
+            return self.featurizer.n_features
+        return len(self.word_list)
 
     def load_meta_data(self, meta_path: str):
         """
@@ -117,6 +312,9 @@ class ModelData:
             with open(meta_path, 'rb') as f:
                 meta_data = pickle.load(f)
             logger.info('Loaded meta data')
+            from hashing_featurizer import featurizer_from_settings
+            self.label_index = LabelIndex(meta_data.get('label_index'))
+            self.featurizer = featurizer_from_settings(meta_data.get('featurizer'))
             return meta_data['word_list'], meta_data['class_names']
         else:
             logger.info('Meta path does not exist')
@@ -130,7 +328,9 @@ class ModelData:
         else:
             meta_data = {
                 'word_list': self.word_list,
-                'class_names': self.class_names
+                'class_names': self.class_names,
+                'label_index': self.label_index.labels,
+                'featurizer': self.featurizer.settings() if self.featurizer else None,
             }
             with open(meta_path, 'wb') as f:
                 pickle.dump(meta_data, f)
@@ -141,15 +341,91 @@ class ModelData:
         Create a one-hot vector for each word in the word_list
         
         Returns: one_hot (list)"""
-        words = re.split(' |/|-', description)
-        one_hot = [0] * len(self.word_list)
-        for word in words:
-            word = word.upper()
-            if word in self.word_list:
-                one_hot[self.word_list.index(word)] = 1
+        one_hot = [0] * self.input_size
+        _, columns = self.featurize_rows([description])
+        for column in columns:
+            one_hot[column] = 1
 
         return one_hot
-    
+
+    def featurize_rows(self, descriptions) -> tuple[list[int], list[int]]:
+        """
+        Map each description to the sorted feature columns it activates
+
+        Returns: crow_indices (list), col_indices (list) in CSR layout"""
+        if self.featurizer is not None:
+            return self.featurizer.featurize_rows(descriptions)
+        if self.processes > 1:
+            return parallel_featurize_rows(list(descriptions), self.word_index, self.processes)
+        return featurize_rows(descriptions, self.word_index)
+
+    def transform(self, descriptions) -> torch.Tensor:
+        """
+        Create a one-hot row for each description in a single pass over the tokens
+
+        Returns: X (torch.Tensor), sparse CSR of shape (len(descriptions), input_size)"""
+        import torch
+
+        crow_indices, col_indices = self.featurize_rows(descriptions)
+        return torch.sparse_csr_tensor(
+            torch.tensor(crow_indices, dtype=torch.int64),
+            torch.tensor(col_indices, dtype=torch.int64),
+            torch.ones(len(col_indices), dtype=torch.float),
+            size=(len(crow_indices) - 1, self.input_size),
+        )
+
+    def transform_bags(self, descriptions) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        Create the input of a SparseNet for each description: the ids of the words it
+        contains, and where the ids of each description start
+
+        Returns: ids (torch.Tensor), offsets (torch.Tensor) of length len(descriptions)"""
+        import torch
+
+        crow_indices, col_indices = self.featurize_rows(descriptions)
+        return torch.tensor(col_indices, dtype=torch.int64), torch.tensor(crow_indices[:-1], dtype=torch.int64)
+
+    def extend(self, raw_data: pd.DataFrame) -> tuple[list[str], list[str]]:
+        """
+        Append the words and classes of newly labeled rows that are not known yet,
+        keeping the columns of existing words and classes in place
+
+        Returns: new_words (list), new_classes (list)"""
+        new_words = []
+        if self.featurizer is None:
+            word_counts = count_words(raw_data['Description'])
+            new_words = [word for word, count in word_counts.items() if count > 1 and word not in self.word_index]
+            if new_words:
+                self.word_list = list(self.word_list) + new_words
+
+        new_classes = []
+        for class_name in raw_data['Class'].unique():
+            if isinstance(class_name, str) and class_name not in self.class_names and class_name not in new_classes:
+                new_classes.append(class_name)
+        self.class_names = list(self.class_names) + new_classes
+
+        self.label_index.update(zip(raw_data['Description'], raw_data['Class']))
+        return new_words, new_classes
+
+    def sample(self, n: int, input_size: int = None, seed: int = None):
+        """
+        Draw up to n random rows of self.X and self.y, padding X with zero columns up to input_size
+
+        Returns: X (torch.Tensor, dense), labels (torch.Tensor) of class indices"""
+        import numpy as np
+        import torch
+
+        rng = np.random.default_rng(seed)
+        rows = rng.choice(self.X.shape[0], size=min(n, self.X.shape[0]), replace=False)
+        crow_indices = self.X.crow_indices().numpy()
+        col_indices = self.X.col_indices().numpy()
+
+        X = torch.zeros(len(rows), input_size or self.X.shape[1])
+        for i, row in enumerate(rows):
+            X[i, torch.from_numpy(col_indices[crow_indices[row]:crow_indices[row + 1]].astype(np.int64))] = 1
+        labels = self.y.columns.to_numpy()[self.y.to_numpy()[rows].argmax(axis=1)].astype(np.int64)
+        return X, torch.from_numpy(labels)
+
     def one_hot_to_class(self, one_hot):
         """
         Convert a one-hot vector to a class name
@@ -161,16 +437,11 @@ class ModelData:
         """
         Create a one-hot vector for each word in the word_list
         
-        Returns: X (pandas.DataFrame), y (pandas.DataFrame)"""
-        # create a dataframe with the words as columns
-        X = pd.DataFrame(columns=self.word_list)
-
-        # add a column for the classification
-        for index, row in self.raw_data.iterrows():
-            # create a one-hot vector for each word in the word_list
-            one_hot = self.description_to_one_hot(row['Description'])
+        Returns: X (torch.Tensor, sparse CSR), y (pandas.DataFrame)"""
+        import pandas as pd
 
-            X.loc[index] = one_hot
+        with metrics.stage('featurize', len(self.raw_data)):
+            X = self.transform(self.raw_data['Description'])
 
         try:
             y = self.raw_data['Class'].apply(lambda x: self.class_names.index(x))
@@ -187,77 +458,174 @@ class ModelData:
         return True
 
 
-    def classify_data(self):
+    def classify_data(self, classifier=None):
         """
-        Classify the data in self.raw_data by prompting the user for a class name for each row"""
-        readline.parse_and_bind("tab: complete")
+        Classify the data in self.raw_data by prompting the user for a class name for each distinct
+        description, most uncertain first if a classifier is given, and applying it to every repeat"""
+        import readline
+        from completion import CompletionIndex
+        from labeling_queue import LabelingQueue
 
-        def complete(text,state):
-            volcab = self.class_names
-            results = [x for x in volcab if x.lower().startswith(text.lower())] + [None]
-            return results[state]
+        readline.parse_and_bind("tab: complete")
 
-        readline.set_completer(complete)
+        completions = CompletionIndex(self.class_names)
+        readline.set_completer(completions.completer())
 
         # add a column for the classification
-        for index, row in self.raw_data.iterrows():
+        descriptions = list(self.raw_data['Description'])
+        if self.near_duplicates:
+            from near_duplicates import cluster_key
+            queue = LabelingQueue(descriptions, classifier, key=cluster_key(descriptions))
+        else:
+            queue = LabelingQueue(descriptions, classifier)
+        while queue.current() is not None:
+            group = queue.current()
+            row = self.raw_data.iloc[group[0]]
+            repeats = f' (x{len(group)})' if len(group) > 1 else ''
             # prompt the user for a class name
-            class_name = input(f'Classify "{row["Description"]}" - ${row["Transaction Amount"]:.2f} as: ')
+            class_name = input(f'Classify "{row["Description"]}" - ${row["Transaction Amount"]:.2f}{repeats} as: ')
             if class_name == '':
                 class_name = 'Other'
             if class_name == 'q':
                 break
-            self.raw_data.loc[index, 'Class'] = class_name
+            queue.label(class_name)
+            self.raw_data.loc[self.raw_data.index[group], 'Class'] = class_name
+            self.label_index.add(row['Description'], class_name)
 
             # add the class name to the list of class names
-            if class_name not in self.class_names:
+            if completions.add(class_name):
                 self.class_names.append(class_name)
 
 
+    def propagate_labels(self) -> int:
+        """
+        Give each unlabeled row of self.raw_data the most common label of its near-duplicate cluster
+
+        Returns: filled (int), the number of rows that were given a label"""
+        from near_duplicates import propagate_labels
+
+        before = self.raw_data['Class'].tolist()
+        after = propagate_labels(list(self.raw_data['Description']), before)
+        filled = [index for index, label in enumerate(before) if not (isinstance(label, str) and label) and isinstance(after[index], str)]
+        self.raw_data.loc[self.raw_data.index[filled], 'Class'] = [after[index] for index in filled]
+        logger.info(f'Propagated labels to {len(filled)} near-duplicate rows')
+        return len(filled)
+
+    def drop_unlabeled(self) -> int:
+        """
+        Drop the rows of self.raw_data that have no label, so they are not trained as a class of their own
+
+        Returns: dropped (int), the number of rows dropped"""
+        classes = self.raw_data['Class']
+        labeled = classes.notna() & (classes.astype(str).str.strip() != '')
+        dropped = int((~labeled).sum())
+        if dropped:
+            self.raw_data = self.raw_data[labeled].reset_index(drop=True)
+            logger.info(f'Dropped {dropped} rows that no near-duplicate could label')
+        return dropped
+
     def load_data(self, data_path: str):
         """
-        Load the data from self.data_path"""
+        Load the data from data_path, memory mapping it unless it is a csv file"""
+        import numpy as np
+        import pandas as pd
+        import torch
+
         if not data_path:
             logger.info('No data path provided')
             return None
-        elif os.path.exists(data_path):
+        elif not os.path.exists(data_path):
+            logger.info('Data path does not exist')
+            return None
+        elif data_path.endswith('.csv'):
             data = pd.read_csv(data_path, index_col=False)
             logger.info('Loaded data')
             X = data.drop('Class', axis=1)
             y = data['Class']
             y = pd.get_dummies(y)
-            self.X = X
+            self.X = torch.tensor(X.to_numpy(), dtype=torch.float).to_sparse_csr()
             self.y = y
             return True
         else:
-            logger.info('Data path does not exist')
-            return None
+            with open(data_path + '.json') as f:
+                header = json.load(f)
+            if header['version'] != DATA_FORMAT_VERSION:
+                logger.info(f'Unsupported data format version {header["version"]}')
+                return None
+
+            # copy-on-write maps are only paged in as they are read and never write back to the file
+            arrays = {}
+            for name, spec in header['arrays'].items():
+                if spec['length']:
+                    arrays[name] = np.memmap(data_path, dtype=spec['dtype'], mode='c', offset=spec['offset'], shape=(spec['length'],))
+                else:
+                    arrays[name] = np.empty(0, dtype=spec['dtype'])
+            logger.info('Loaded data')
+
+            self.X = torch.sparse_csr_tensor(
+                torch.from_numpy(arrays['crow_indices']),
+                torch.from_numpy(arrays['col_indices']),
+                torch.ones(len(arrays['col_indices']), dtype=torch.float),
+                size=tuple(header['shape']),
+            )
+            self.y = pd.get_dummies(pd.Categorical(arrays['labels'], categories=range(header['classes'])))
+            return True
 
     def save_data(self, data_path: str):
         """
-        Save the data to data_path"""
+        Save the data to data_path as a csv file if it ends in .csv, otherwise as raw arrays
+        with a json header alongside in data_path + '.json'"""
+        import numpy as np
+        import pandas as pd
+
         if not data_path:
             logger.info('No data path provided')
-        else:
-            data = pd.concat([self.X, self.y], axis=1)
+            return
+
+        labels = self.y.columns.to_numpy()[self.y.to_numpy().argmax(axis=1)].astype(np.int64)
+        if data_path.endswith('.csv'):
+            data = pd.DataFrame(self.X.to_dense().numpy(), columns=self.word_list or None, index=self.y.index)
+            data['Class'] = labels
             data.to_csv(data_path, index=False)
-            logger.info('Saved data')
+        else:
+            arrays = {
+                'crow_indices': self.X.crow_indices().numpy().astype(np.int64),
+                'col_indices': self.X.col_indices().numpy().astype(np.int64),
+                'labels': labels,
+            }
+            header = {
+                'version': DATA_FORMAT_VERSION,
+                'shape': list(self.X.shape),
+                'classes': int(max(len(self.class_names or []), labels.max(initial=-1) + 1)),
+                'arrays': {},
+            }
+            offset = 0
+            with open(data_path, 'wb') as f:
+                for name, array in arrays.items():
+                    header['arrays'][name] = {'dtype': array.dtype.str, 'offset': offset, 'length': len(array)}
+                    f.write(array.tobytes())
+                    offset += array.nbytes
+            with open(data_path + '.json', 'w') as f:
+                json.dump(header, f)
+        logger.info('Saved data')
 
     def create_word_list(self):
         """
         Create a list of keywords from the Description column of self.raw_data
         
         Returns: word_list (list)"""
-        word_list = {}
-        for description in self.raw_data['Description']:
-            words = re.split(' |/|-', description)[:-2]
-            for word in words:
-                if len(word) >= 2 and not word.replace('#', '').isnumeric():
-                    if word not in word_list:
-                        word_list[word] = 1
-                    else:
-                        word_list[word] += 1
-                
+        from concurrent.futures import ProcessPoolExecutor
+
+        descriptions = list(self.raw_data['Description'])
+        shards = split_shards(descriptions, self.processes)
+        with metrics.stage('create_word_list', len(descriptions)):
+            if len(shards) > 1:
+                # count each shard in its own process and merge in shard order
+                with ProcessPoolExecutor(len(shards)) as executor:
+                    word_list = merge_word_counts(executor.map(count_words, shards))
+            else:
+                word_list = count_words(descriptions)
+
         # remove words that only appear once
         word_list = {k: v for k, v in word_list.items() if v > 1}
 
@@ -1,24 +1,110 @@
 # load model.pth and use it to predict the budget line for a new transaction
 import os
+import copy
+import math
+import hashlib
+import io
+import time
 import torch
-import logging
+import torch.nn.functional as F
+from dataclasses import dataclass
+from torch.utils.data import DataLoader, Dataset, random_split
 
-from net import Net
+from log import get_logger
+from metrics import metrics
+from net import Net, SparseNet, dense_to_bags, sparse_to_net_state_dict
 
-logger = logging.getLogger(__name__)
-# log to console
-logger.addHandler(logging.StreamHandler())
-if os.environ.get('DEBUG'):
-    logger.setLevel(logging.DEBUG)
+logger = get_logger('model')
 
 
+@dataclass
+class TrainingReport:
+    """TrainingReport class
+    """
+    epochs: int
+    train_loss: float
+    validation_loss: float
+    seconds: float
+    stopped_early: bool
+
+
+@dataclass
+class QuantizationReport:
+    """How a quantized model compares to the float model it was made from on held-out rows."""
+    dtype: str
+    rows: int
+    float_accuracy: float
+    quantized_accuracy: float
+    # quantized_accuracy - float_accuracy
+    accuracy_delta: float
+    # fraction of rows whose top class did not change
+    agreement: float
+    max_confidence_delta: float
+    float_bytes: int
+    quantized_bytes: int
+    float_seconds: float
+    quantized_seconds: float
+
+
+class RowDataset(Dataset):
+    """The rows of X, dense or sparse CSR, with their targets y.
+
+    Items are row numbers; collate turns the rows of a mini-batch into one dense batch, so a
+    sparse X is never densified as a whole."""
+
+    def __init__(self, X: torch.Tensor, y: torch.Tensor):
+        """Initialize the RowDataset class."""
+        self.X = X
+        self.y = y
+        self.sparse = X.layout == torch.sparse_csr
+        if self.sparse:
+            self.crow_indices = X.crow_indices()
+            self.col_indices = X.col_indices()
+            self.values = X.values()
+
+    def __len__(self) -> int:
+        return self.X.shape[0]
+
+    def __getitem__(self, index: int) -> int:
+        return index
+
+    def collate(self, rows: list[int]) -> tuple[torch.Tensor, torch.Tensor]:
+        """
+        Stack the given rows of X and y into dense tensors
+
+        Returns: X_batch (torch.Tensor), y_batch (torch.Tensor)"""
+        rows = torch.tensor(rows, dtype=torch.int64)
+        if not self.sparse:
+            return self.X[rows], self.y[rows]
+
+        starts = self.crow_indices[rows]
+        counts = self.crow_indices[rows + 1] - starts
+        # position in col_indices of every entry of the batch, row after row
+        batch_offsets = torch.cumsum(counts, 0) - counts
+        positions = torch.arange(int(counts.sum())) + torch.repeat_interleave(starts - batch_offsets, counts)
+        X_batch = torch.zeros(len(rows), self.X.shape[1], dtype=self.values.dtype)
+        X_batch[torch.repeat_interleave(torch.arange(len(rows)), counts), self.col_indices[positions]] = self.values[positions]
+        return X_batch, self.y[rows]
+
+
+# post-training quantization: int8 stores the linear weights as 8-bit integers and quantizes
+# activations on the fly; float16 only stores every parameter as a half, and computes in float32
+# with the weights it needs cast back, as CPUs have no half precision kernels for these layers
+QUANTIZATION_DTYPES = ('int8', 'float16')
+
 
 class Model:
-    def __init__(self, model_path = 'model.pth', input_size = 54, hidden_size = 128, output_size = 15):
+    def __init__(self, model_path = 'model.pth', input_size = 54, hidden_size = 128, output_size = 15, sparse = False):
         self.input_size = input_size
+        self.hidden_size = hidden_size
         self.output_size = output_size
 
         self.model = Net(input_size, hidden_size, output_size)
+        self._version = None
+        # None for the float model, or the dtype of a model returned by quantize()
+        self.quantization = None
+        # run a SparseNet, taking the ids of the active words, instead of a Net
+        self.sparse = sparse
         
         if not model_path:
             logger.info('No model path provided, initializing a new model')
@@ -27,58 +113,307 @@ class Model:
             logger.info('Loaded model')
         else:
             logger.info('Model path does not exist, initializing a new model')
+        if sparse:
+            self.model = SparseNet.from_net(self.model)
+
+    def state_dict(self) -> dict:
+        """Return the parameters in the layout of Net, which is how they are saved whether or not the model is sparse."""
+        if self.sparse:
+            return sparse_to_net_state_dict(self.model.state_dict())
+        return self.model.state_dict()
+
+    @property
+    def version(self) -> str:
+        """A digest of the weights, recomputed after the model is trained."""
+        if self._version is None:
+            digest = hashlib.sha256()
+            for name, tensor in self.state_dict().items():
+                digest.update(name.encode())
+                digest.update(tensor.detach().cpu().numpy().tobytes())
+            self._version = digest.hexdigest()[:16]
+        return self._version
+
+    def expand(self, input_size: int, output_size: int):
+        """Grow the input and output layers to new sizes, keeping the learned weights.
+
+        Weights of new input columns start at zero, so predictions only change once the
+        model is trained on rows that use the new words."""
+        assert self.quantization is None, 'quantized models cannot be expanded'
+        assert input_size >= self.input_size
+        assert output_size >= self.output_size
+        if (input_size, output_size) == (self.input_size, self.output_size):
+            return
+
+        old = self.model.to_net() if self.sparse else self.model
+        net = Net(input_size, self.hidden_size, output_size)
+        with torch.no_grad():
+            net.fc1.weight[:, self.input_size:] = 0
+            net.fc1.weight[:, :self.input_size] = old.fc1.weight
+            net.fc1.bias.copy_(old.fc1.bias)
+            net.fc2.weight[:self.output_size] = old.fc2.weight
+            net.fc2.bias[:self.output_size] = old.fc2.bias
+        logger.info(f'Expanded model from {self.input_size}x{self.output_size} to {input_size}x{output_size}')
+
+        self.model = SparseNet.from_net(net) if self.sparse else net
+        self.input_size = input_size
+        self.output_size = output_size
+        self._version = None
 
-    
     def save(self, model_path = 'model.pth'):
-        torch.save(self.model.state_dict(), model_path)
+        assert self.quantization is None, 'save the float model, quantize it after loading'
+        torch.save(self.state_dict(), model_path)
         logger.info('Saved model')
 
-    def train(self, X: torch.Tensor, y: torch.Tensor, epochs: int = 1000):
+    def numpy_arrays(self) -> dict:
+        """Return a copy of every parameter as a numpy array, by name."""
+        assert self.quantization != 'int8', 'int8 weights have no numpy equivalent, export the float model'
+        return {name: tensor.detach().cpu().numpy().copy() for name, tensor in self.state_dict().items()}
+
+    def export_numpy(self, path: str):
+        """Save the weights as a numpy .npz file that NumpyNet.load runs without torch."""
+        import numpy as np
+        np.savez(path, **self.numpy_arrays())
+        logger.info('Exported model weights')
+
+    def numpy_net(self):
+        """Return a NumpyNet running a copy of the current weights."""
+        from numpy_net import NumpyNet
+        return NumpyNet(self.numpy_arrays())
+
+    def quantize(self, dtype: str = 'int8') -> 'Model':
+        """Return a copy of the model for inference only, with its weights stored as dtype (int8 or float16).
+
+        int8 cuts the size of the weights about four times and float16, which still computes in float32,
+        about two times; check the predictions still agree with compare_quantized on held-out rows
+        before using it.
+
+        Returns: model (Model)"""
+        if dtype not in QUANTIZATION_DTYPES:
+            raise ValueError(f'Unknown quantization {dtype}, expected one of {QUANTIZATION_DTYPES}')
+        assert self.quantization is None, 'the model is already quantized'
+
+        quantized = copy.copy(self)
+        net = copy.deepcopy(self.model).eval()
+        if dtype == 'int8':
+            from torch.ao.quantization import default_dynamic_qconfig, float_qparams_weight_only_qconfig
+            # the embeddings of a sparse model are stored as 8-bit rows with their own scale
+            qconfig = {torch.nn.Linear: default_dynamic_qconfig, torch.nn.EmbeddingBag: float_qparams_weight_only_qconfig}
+            quantized.model = torch.ao.quantization.quantize_dynamic(net, qconfig)
+        else:
+            quantized.model = net.half()
+        quantized.quantization = dtype
+        # predictions of the quantized model are cached apart from the float model's
+        quantized._version = f'{self.version}-{dtype}'
+        logger.info(f'Quantized model to {dtype}')
+        return quantized
+
+    def size_bytes(self) -> int:
+        """Return the size of the saved weights."""
+        buffer = io.BytesIO()
+        torch.save(self.model.state_dict(), buffer)
+        return buffer.tell()
+
+    def compare_quantized(self, quantized: 'Model', X: torch.Tensor, labels: torch.Tensor,
+                          batch_size: int = 1024) -> QuantizationReport:
+        """Compare the predictions of a quantized copy of this model with its own on held-out rows X of classes labels.
+
+        Returns: report (QuantizationReport)"""
+        assert len(X) == len(labels) > 0
+
+        start = time.perf_counter()
+        confidences, indices = self.predict_batch(X, k=1, batch_size=batch_size)
+        float_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        quantized_confidences, quantized_indices = quantized.predict_batch(X, k=1, batch_size=batch_size)
+        quantized_seconds = time.perf_counter() - start
+
+        float_accuracy = (indices[:, 0] == labels).float().mean().item()
+        quantized_accuracy = (quantized_indices[:, 0] == labels).float().mean().item()
+        report = QuantizationReport(
+            dtype=quantized.quantization,
+            rows=len(X),
+            float_accuracy=float_accuracy,
+            quantized_accuracy=quantized_accuracy,
+            accuracy_delta=quantized_accuracy - float_accuracy,
+            agreement=(quantized_indices == indices).float().mean().item(),
+            max_confidence_delta=(quantized_confidences - confidences).abs().max().item(),
+            float_bytes=self.size_bytes(),
+            quantized_bytes=quantized.size_bytes(),
+            float_seconds=float_seconds,
+            quantized_seconds=quantized_seconds,
+        )
+        logger.info(f'Quantization report: {report}')
+        return report
+
+    def _forward(self, X: torch.Tensor) -> torch.Tensor:
+        # a sparse model takes the bags of the rows
+        if self.sparse:
+            return self._forward_bags(*dense_to_bags(X))
+        if self.quantization == 'float16':
+            hidden = F.linear(X, self.model.fc1.weight.float(), self.model.fc1.bias.float())
+            return self._output_float16(hidden)
+        return self.model(X)
+
+    def _forward_bags(self, ids: torch.Tensor, offsets: torch.Tensor, per_sample_weights: torch.Tensor = None) -> torch.Tensor:
+        if self.quantization != 'float16':
+            return self.model(ids, offsets, per_sample_weights)
+        # cast back only the embeddings of the words in the batch, and sum those of each row
+        embeddings = self.model.embedding.weight[ids].float()
+        if per_sample_weights is not None:
+            embeddings = embeddings * per_sample_weights.float().unsqueeze(1)
+        counts = torch.diff(offsets, append=torch.tensor([len(ids)]))
+        rows = torch.repeat_interleave(torch.arange(len(offsets)), counts)
+        hidden = torch.zeros(len(offsets), self.hidden_size).index_add_(0, rows, embeddings)
+        return self._output_float16(hidden + self.model.bias.float())
+
+    def _output_float16(self, hidden: torch.Tensor) -> torch.Tensor:
+        x = F.linear(F.relu(hidden), self.model.fc2.weight.float(), self.model.fc2.bias.float())
+        return F.softmax(x, dim=1)
+
+    def train(self, X: torch.Tensor, y: torch.Tensor, epochs: int = 1000, batch_size: int = 64,
+              learning_rate: float = 1e-3, validation_split: float = 0.2, patience: int = 10,
+              min_delta: float = 0.0, seed: int = None) -> TrainingReport:
+        """Train on shuffled mini-batches until the validation loss stops improving.
+
+        X may be dense or sparse CSR; a sparse X is made dense one mini-batch at a time.
+        epochs is an upper bound; training stops once the validation loss has not improved by
+        more than min_delta for patience epochs, and the best weights seen are kept.
+
+        Returns: report (TrainingReport)"""
+        assert self.quantization is None, 'quantized models cannot be trained'
         # check if X and y are the correct shape
         assert X.shape[1] == self.input_size
         assert y.shape[1] == self.output_size
 
         assert X.shape[0] == y.shape[0]
+        assert X.shape[0] > 0
+        if epochs < 1:
+            raise ValueError(f'epochs must be at least 1, got {epochs}')
+        validation_size = int(X.shape[0] * validation_split)
+        if X.shape[0] - validation_size < 1:
+            raise ValueError(f'validation_split {validation_split} of {X.shape[0]} rows leaves no rows to train on')
+
+        start = time.perf_counter()
 
         # Create a loss function
         loss_fn = torch.nn.MSELoss(reduction='sum')
 
         # Create an optimizer
-        learning_rate = 1e-4
         optimizer = torch.optim.Adam(self.model.parameters(), lr=learning_rate)
 
-        # separate the data into training and testing
-        X_train = X[:int(len(X) * 0.8)]
-        X_test = X[int(len(X) * 0.8):]
+        # separate the data into a shuffled training and validation set
+        generator = torch.Generator()
+        if seed is None:
+            generator.seed()
+        else:
+            generator.manual_seed(seed)
+        dataset = RowDataset(X, y)
+        train_set, validation_set = random_split(dataset, [len(dataset) - validation_size, validation_size], generator=generator)
+        train_loader = DataLoader(train_set, batch_size=batch_size, shuffle=True, generator=generator, collate_fn=dataset.collate)
+        validation_loader = DataLoader(validation_set, batch_size=max(batch_size, 1024), collate_fn=dataset.collate)
 
-        y_train = y[:int(len(y) * 0.8)]
-        y_test = y[int(len(y) * 0.8):]
+        best_loss = math.inf
+        best_state = None
+        epochs_without_improvement = 0
+        stopped_early = False
 
         # train the model
-        for t in range(epochs):
-            # Forward pass: compute predicted y by passing x to the model.
-            y_pred = self.model(X_train)
+        for epoch in range(epochs):
+            epoch_start = time.perf_counter()
+            train_loss = 0.0
+            for X_batch, y_batch in train_loader:
+                # Forward pass: compute predicted y by passing x to the model.
+                loss = loss_fn(self._forward(X_batch), y_batch)
 
-            # Compute and print loss.
-            loss = loss_fn(y_pred, y_train)
-            if t % 100 == 99:
-                print(t, loss.item())
+                # Zero gradients, perform a backward pass, and update the weights.
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+                train_loss += loss.item()
+            train_loss /= len(train_set)
+            metrics.observe('epoch_seconds', time.perf_counter() - epoch_start)
 
-            # Zero gradients, perform a backward pass, and update the weights.
-            optimizer.zero_grad()
-            loss.backward()
-            optimizer.step()
+            # without a validation set, stop once the training loss plateaus instead
+            validation_loss = self.evaluate(validation_loader, loss_fn) if validation_size else train_loss
+            logger.debug(f'epoch {epoch + 1}: train loss {train_loss:.6f}, validation loss {validation_loss:.6f}')
 
-        # test the model
+            if validation_loss < best_loss - min_delta:
+                best_loss = validation_loss
+                best_state = copy.deepcopy(self.model.state_dict())
+                epochs_without_improvement = 0
+            else:
+                epochs_without_improvement += 1
+                if epochs_without_improvement >= patience:
+                    stopped_early = True
+                    break
+
+        if best_state is not None:
+            self.model.load_state_dict(best_state)
+        self._version = None
+
+        report = TrainingReport(epoch + 1, train_loss, best_loss, time.perf_counter() - start, stopped_early)
+        if metrics.enabled:
+            # rows counts every training row once per epoch
+            metrics.add_stage('train', report.seconds, len(train_set) * report.epochs)
+        logger.info(f'Trained for {report.epochs} epochs in {report.seconds:.2f}s, validation loss: {report.validation_loss}')
+        return report
+
+    def evaluate(self, loader: DataLoader, loss_fn) -> float:
+        """Return the mean loss per row over every batch in loader."""
+        total = 0.0
+        rows = 0
         with torch.no_grad():
-            y_pred = self.model(X_test)
-            loss = loss_fn(y_pred, y_test)
-            print("Test loss:", loss.item())
+            for X_batch, y_batch in loader:
+                total += loss_fn(self._forward(X_batch), y_batch).item()
+                rows += len(X_batch)
+        return total / rows
 
     def predict(self, one_hot: torch.Tensor):
         # one_hot = description_to_one_hot(description)
         # one_hot = torch.tensor(one_hot, dtype=torch.float32)
-        prediction = self.model(one_hot)
-        return prediction
+        prediction = self._forward(one_hot)
+        return prediction.float()
+
+    def predict_batch(self, X: torch.Tensor, k: int = 1, batch_size: int = 1024):
+        """Predict the top k classes for every row of X, batch_size rows at a time.
+
+        Returns: confidences (torch.Tensor), indices (torch.Tensor), both of shape (len(X), k)"""
+        k = min(k, self.output_size)
+        confidences = [torch.empty(0, k)]
+        indices = [torch.empty(0, k, dtype=torch.int64)]
+        with torch.inference_mode(), metrics.stage('predict', X.shape[0]):
+            for start in range(0, X.shape[0], batch_size):
+                prediction = self._forward(X[start:start + batch_size]).float()
+                top = prediction.topk(k, dim=1)
+                confidences.append(top.values)
+                indices.append(top.indices)
+        return torch.cat(confidences), torch.cat(indices)
+
+    def predict_rows(self, crow_indices, col_indices, k: int = 1, batch_size: int = 1024):
+        """Predict the top k classes for every multi-hot row in CSR layout, batch_size rows at a time.
 
+        A sparse model takes the columns of each batch as they are; a dense one needs them as dense rows.
 
+        Returns: confidences (torch.Tensor), indices (torch.Tensor), both of shape (rows, k)"""
+        crow_indices = torch.as_tensor(crow_indices, dtype=torch.int64)
+        col_indices = torch.as_tensor(col_indices, dtype=torch.int64)
+        rows = len(crow_indices) - 1
+        k = min(k, self.output_size)
+        confidences = [torch.empty(0, k)]
+        indices = [torch.empty(0, k, dtype=torch.int64)]
+        with torch.inference_mode(), metrics.stage('predict', rows):
+            for start in range(0, rows, batch_size):
+                batch_crow_indices = crow_indices[start:start + batch_size + 1]
+                first, last = batch_crow_indices[0].item(), batch_crow_indices[-1].item()
+                ids = col_indices[first:last]
+                offsets = batch_crow_indices[:-1] - first
+                if self.sparse:
+                    prediction = self._forward_bags(ids, offsets)
+                else:
+                    X = torch.sparse_csr_tensor(batch_crow_indices - first, ids, torch.ones(len(ids)),
+                                                size=(len(offsets), self.input_size))
+                    prediction = self._forward(X.to_dense())
+                top = prediction.float().topk(k, dim=1)
+                confidences.append(top.values)
+                indices.append(top.indices)
+        return torch.cat(confidences), torch.cat(indices)
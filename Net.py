@@ -1,3 +1,6 @@
+import math
+
+import torch
 from torch import nn
 import torch.nn.functional as F
 
@@ -12,4 +15,72 @@ class Net(nn.Module):
         x = self.fc2(x)
         x = F.softmax(x, dim=1)
         return x
-        
\ No newline at end of file
+        
+
+def dense_to_bags(x):
+    """Return the bags of x for SparseNet: the columns of the nonzero entries of every row,
+    where each row's columns start, and the entries themselves."""
+    rows, ids = x.nonzero(as_tuple=True)
+    counts = torch.bincount(rows, minlength=x.shape[0])
+    offsets = torch.cumsum(counts, 0) - counts
+    return ids, offsets, x[rows, ids]
+
+
+class SparseNet(nn.Module):
+    """Net with its first layer as a sum of embeddings, taking the active words of each row
+    as ids and offsets, so a prediction costs as much as the words in the description
+    instead of the size of the vocabulary.
+
+    embedding.weight is the transpose of Net's fc1.weight and bias is fc1.bias."""
+    def __init__(self, input_size, hidden_size, output_size):
+        super(SparseNet, self).__init__()
+        self.embedding = nn.EmbeddingBag(input_size, hidden_size, mode='sum')
+        self.bias = nn.Parameter(torch.empty(hidden_size))
+        self.fc2 = nn.Linear(hidden_size, output_size)
+        # start from the same distribution as nn.Linear
+        bound = 1 / math.sqrt(input_size) if input_size > 0 else 0
+        nn.init.uniform_(self.embedding.weight, -bound, bound)
+        nn.init.uniform_(self.bias, -bound, bound)
+
+    def forward(self, ids, offsets, per_sample_weights=None):
+        x = F.relu(self.embedding(ids, offsets, per_sample_weights=per_sample_weights) + self.bias)
+        x = self.fc2(x)
+        x = F.softmax(x, dim=1)
+        return x
+
+    def forward_dense(self, x):
+        """Return the same as Net.forward for dense rows x."""
+        return self(*dense_to_bags(x))
+
+    @classmethod
+    def from_net(cls, net):
+        """Return a SparseNet computing the same function as net."""
+        sparse_net = cls(net.fc1.in_features, net.fc1.out_features, net.fc2.out_features)
+        sparse_net.load_state_dict(net_to_sparse_state_dict(net.state_dict()))
+        return sparse_net
+
+    def to_net(self):
+        """Return a Net computing the same function."""
+        net = Net(self.embedding.num_embeddings, self.embedding.embedding_dim, self.fc2.out_features)
+        net.load_state_dict(sparse_to_net_state_dict(self.state_dict()))
+        return net
+
+
+def net_to_sparse_state_dict(state_dict):
+    """Map the parameters of a Net to those of a SparseNet."""
+    return {
+        'embedding.weight': state_dict['fc1.weight'].t().contiguous(),
+        'bias': state_dict['fc1.bias'],
+        'fc2.weight': state_dict['fc2.weight'],
+        'fc2.bias': state_dict['fc2.bias'],
+    }
+
+
+def sparse_to_net_state_dict(state_dict):
+    """Map the parameters of a SparseNet to those of a Net."""
+    return {
+        'fc1.weight': state_dict['embedding.weight'].t().contiguous(),
+        'fc1.bias': state_dict['bias'],
+        'fc2.weight': state_dict['fc2.weight'],
+        'fc2.bias': state_dict['fc2.bias'],
+    }
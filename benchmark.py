@@ -0,0 +1,225 @@
+# time and measure the memory of each stage of the pipeline on synthetic statements, so
+# regressions can be caught by comparing the JSON output of two versions
+#
+#   python benchmark.py --rows 1000 100000 1000000 --output benchmark.json
+from __future__ import annotations
+
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+
+from metrics import max_rss_mb
+
+# merchants by class, with how their descriptions usually look on a statement
+MERCHANTS = {
+    'Coffee': ['TIM HORTONS', 'STARBUCKS', 'SECOND CUP', 'BALZACS COFFEE', 'COFFEE TIME'],
+    'Groceries': ['LOBLAWS', 'SOBEYS', 'METRO', 'NO FRILLS', 'FARM BOY', 'FOOD BASICS', 'WHOLE FOODS MARKET'],
+    'Gas': ['SHELL', 'PETRO-CANADA', 'ESSO', 'HUSKY', 'ULTRAMAR', 'PIONEER'],
+    'Restaurants': ['MCDONALDS', 'SUBWAY', 'A&W', 'PIZZA PIZZA', 'SWISS CHALET', 'THE KEG STEAKHOUSE', 'MARY BROWNS'],
+    'Subscriptions': ['NETFLIX.COM', 'SPOTIFY P1A2B3C', 'APPLE.COM/BILL', 'AMAZON PRIME*MEMBER', 'DISNEY PLUS'],
+    'Transport': ['UBER TRIP', 'LYFT RIDE', 'PRESTO FARE', 'GO TRANSIT', 'CITY PARKING'],
+    'Shopping': ['AMAZON.CA*MKTPLACE', 'CANADIAN TIRE', 'WALMART', 'BEST BUY', 'IKEA', 'WINNERS', 'DOLLARAMA'],
+    'Utilities': ['ROGERS', 'BELL CANADA', 'HYDRO ONE', 'ENBRIDGE GAS', 'TORONTO HYDRO'],
+}
+# typical amount range of each class
+AMOUNTS = {
+    'Coffee': (1.5, 12), 'Groceries': (8, 250), 'Gas': (20, 110), 'Restaurants': (6, 120),
+    'Subscriptions': (5, 25), 'Transport': (3, 60), 'Shopping': (5, 400), 'Utilities': (40, 250),
+}
+CITIES = [
+    ('TORONTO', 'ON'), ('OTTAWA', 'ON'), ('MISSISSAUGA', 'ON'), ('HAMILTON', 'ON'), ('MONTREAL', 'QC'),
+    ('VANCOUVER', 'BC'), ('CALGARY', 'AB'), ('EDMONTON', 'AB'), ('HALIFAX', 'NS'), ('WINNIPEG', 'MB'),
+]
+# number of locations of each merchant a person shops at
+STORES_PER_MERCHANT = 20
+
+
+def generate_statement(rows: int, seed: int = 0):
+    """
+    Generate a statement of rows transactions with realistic descriptions, amounts and classes
+
+    Returns: statement (pandas.DataFrame) with Description, Transaction Amount and Class columns"""
+    import pandas as pd
+
+    rng = random.Random(seed)
+    classes = list(MERCHANTS)
+    stores = {merchant: [rng.randrange(1, 10000) for _ in range(STORES_PER_MERCHANT)]
+              for names in MERCHANTS.values() for merchant in names}
+
+    descriptions = []
+    amounts = []
+    labels = []
+    for _ in range(rows):
+        label = rng.choice(classes)
+        merchant = rng.choice(MERCHANTS[label])
+        city, province = rng.choice(CITIES)
+        if label in ('Subscriptions', 'Utilities'):
+            description = f'{merchant} {province}'
+        else:
+            description = f'{merchant} #{rng.choice(stores[merchant]):04d} {city} {province}'
+        descriptions.append(description)
+        amounts.append(round(rng.uniform(*AMOUNTS[label]), 2))
+        labels.append(label)
+    return pd.DataFrame({'Description': descriptions, 'Transaction Amount': amounts, 'Class': labels})
+
+
+@dataclass
+class StageResult:
+    """The time and memory one stage took on a statement of rows rows."""
+    stage: str
+    rows: int
+    seconds: float
+    rows_per_second: float
+    # peak memory allocated by Python objects during the stage (tensor storage is not included)
+    peak_traced_mb: float | None
+    # peak resident memory of the whole process so far
+    max_rss_mb: float | None
+
+
+def measure(stage: str, rows: int, function, *args, trace_memory: bool = True, **kwargs):
+    """
+    Run function(*args, **kwargs), timing it and tracking its peak memory
+
+    Returns: result (StageResult), value returned by function"""
+    gc.collect()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        # keep stdout for the JSON results
+        with contextlib.redirect_stdout(sys.stderr):
+            value = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20 if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    result = StageResult(stage, rows, seconds, rows / seconds if seconds else float('inf'), peak, max_rss_mb())
+    print(f'{stage} on {rows} rows: {seconds:.3f}s', file=sys.stderr)
+    return result, value
+
+
+def run(rows: int, seed: int = 0, train_rows: int = 10000, epochs: int = 5, one_hot_max_rows: int = 10000,
+        trace_memory: bool = True, directory: str = None) -> list[StageResult]:
+    """
+    Benchmark every stage of the pipeline on a synthetic statement of rows rows
+
+    Training uses a sample of at most train_rows rows, so its time stays bounded and comparable
+    however many rows the statement has.
+    data_to_one_hot builds a column per word with pandas and is skipped above one_hot_max_rows.
+
+    Returns: results (list) of StageResult"""
+    import torch
+    from classifier import Classifier
+    from data import LabelData, ModelData, data_to_one_hot
+    from model import Model
+
+    options = {'trace_memory': trace_memory}
+    results = []
+
+    result, statement = measure('generate_statement', rows, generate_statement, rows, seed, **options)
+    results.append(result)
+
+    model_data = ModelData()
+    model_data.raw_data = statement
+    result, model_data.word_list = measure('create_word_list', rows, model_data.create_word_list, **options)
+    results.append(result)
+    model_data.class_names = list(statement['Class'].unique())
+    result, _ = measure('preprocess_data', rows, model_data.preprocess_data, **options)
+    results.append(result)
+
+    if rows <= one_hot_max_rows:
+        label_data = LabelData(statement['Description'], statement['Class'])
+        result, _ = measure('data_to_one_hot', rows, data_to_one_hot, label_data, **options)
+        results.append(result)
+
+    torch.manual_seed(seed)
+    model = Model(model_path='', input_size=model_data.input_size, hidden_size=128, output_size=len(model_data.class_names))
+    X, labels = model_data.sample(train_rows, seed=seed)
+    y = torch.nn.functional.one_hot(labels, len(model_data.class_names)).float()
+    result, _ = measure('train', len(X), model.train, X, y, epochs=epochs, patience=epochs, seed=seed, **options)
+    results.append(result)
+
+    classifier = Classifier(model_data, model)
+    descriptions = list(statement['Description'])
+    result, _ = measure('predict', rows, classifier.predict, descriptions, **options)
+    results.append(result)
+
+    with tempfile.TemporaryDirectory(dir=directory) as workdir:
+        path = os.path.join(workdir, 'data.bin')
+        result, _ = measure('save_data', rows, model_data.save_data, path, **options)
+        results.append(result)
+        result, _ = measure('load_data', rows, ModelData().load_data, path, **options)
+        results.append(result)
+    return results
+
+
+def warm_up():
+    """Pay the one-time cost of importing pandas and initializing torch before anything is timed."""
+    import torch
+    from model import Model
+
+    generate_statement(10)
+    with contextlib.redirect_stdout(sys.stderr):
+        Model(model_path='', input_size=4, hidden_size=4, output_size=2).train(
+            torch.zeros(8, 4), torch.zeros(8, 2), epochs=1, validation_split=0.0)
+
+
+def environment() -> dict:
+    """Return what the results depend on, to tell apart runs of different versions and machines."""
+    import torch
+
+    try:
+        revision = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        revision = None
+    return {
+        'revision': revision,
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline on synthetic statements.')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000, 1000000], help='statement sizes to benchmark')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the generated statements and of training')
+    parser.add_argument('--train-rows', type=int, default=10000, help='number of rows sampled to train on')
+    parser.add_argument('--epochs', type=int, default=5, help='number of epochs to train for')
+    parser.add_argument('--one-hot-max-rows', type=int, default=10000, help='largest statement to run data_to_one_hot on')
+    parser.add_argument('--no-trace-memory', action='store_true', help='skip tracemalloc, which slows Python-heavy stages down')
+    parser.add_argument('--output', help='where to write the JSON results (default: stdout)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = []
+    warm_up()
+    for rows in args.rows:
+        results.extend(run(rows, args.seed, args.train_rows, args.epochs, args.one_hot_max_rows,
+                           trace_memory=not args.no_trace_memory))
+
+    report = json.dumps({'environment': environment(), 'results': [asdict(result) for result in results]}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
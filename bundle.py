@@ -0,0 +1,143 @@
+# a single versioned file holding everything needed to classify descriptions:
+# the layer sizes, vocabulary, class names, tokenizer settings and the weights
+#
+# layout: magic, format version, header length, json header, then the raw weight
+# arrays, each aligned to ALIGNMENT bytes so they can be memory mapped in place
+import os
+import json
+import struct
+import hashlib
+
+BUNDLE_MAGIC = b'BLCB'
+BUNDLE_FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+# magic, format version, header length
+PREAMBLE = struct.Struct('<4sIQ')
+
+
+def _padding(offset: int) -> int:
+    return -offset % ALIGNMENT
+
+
+def tokenizer_settings() -> dict:
+    """Return the settings of the tokenizer used by ModelData."""
+    from data import TOKEN_PATTERN
+    return {'pattern': TOKEN_PATTERN.pattern, 'uppercase': True}
+
+
+def save_bundle(path: str, model, model_data) -> str:
+    """Save the weights of model and the vocabulary and classes of model_data to path.
+
+    Returns: model_version (str), a digest of everything the predictions depend on"""
+    arrays = {name: tensor.detach().cpu().contiguous().numpy() for name, tensor in model.state_dict().items()}
+    header = {
+        'input_size': model.input_size,
+        'hidden_size': model.hidden_size,
+        'output_size': model.output_size,
+        'tokenizer': tokenizer_settings(),
+        'featurizer': model_data.featurizer.settings() if model_data.featurizer else None,
+        'word_list': list(model_data.word_list),
+        'class_names': [str(class_name) for class_name in model_data.class_names],
+        'label_index': model_data.label_index.labels,
+        'tensors': {},
+    }
+
+    digest = hashlib.sha256(json.dumps(header, sort_keys=True).encode())
+    offset = 0
+    for name, array in arrays.items():
+        header['tensors'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        digest.update(array.tobytes())
+        offset += array.nbytes + _padding(array.nbytes)
+    header['model_version'] = digest.hexdigest()[:16]
+
+    header_bytes = json.dumps(header).encode()
+    header_bytes += b' ' * _padding(PREAMBLE.size + len(header_bytes))
+    # write next to path and swap it in, since the weights may be mapped from the old file
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(PREAMBLE.pack(BUNDLE_MAGIC, BUNDLE_FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for array in arrays.values():
+            f.write(array.tobytes())
+            f.write(b'\0' * _padding(array.nbytes))
+    os.replace(temp_path, path)
+    return header['model_version']
+
+
+class ModelBundle:
+    """A class for reading a model bundle, loading the weights only when they are first needed."""
+
+    def __init__(self, path: str, header: dict, data_offset: int):
+        """Initialize the ModelBundle class."""
+        self.path = path
+        self.header = header
+        self.data_offset = data_offset
+        self._arrays = None
+
+    @classmethod
+    def load(cls, path: str) -> 'ModelBundle':
+        """Read the header of the bundle at path."""
+        with open(path, 'rb') as f:
+            preamble = f.read(PREAMBLE.size)
+            if len(preamble) < PREAMBLE.size:
+                raise ValueError(f'{path} is not a model bundle')
+            magic, version, header_length = PREAMBLE.unpack(preamble)
+            if magic != BUNDLE_MAGIC:
+                raise ValueError(f'{path} is not a model bundle')
+            if version != BUNDLE_FORMAT_VERSION:
+                raise ValueError(f'Unsupported model bundle version {version}')
+            header = json.loads(f.read(header_length))
+        if header['tokenizer'] != tokenizer_settings():
+            raise ValueError(f'{path} was built with a different tokenizer: {header["tokenizer"]}')
+        return cls(path, header, PREAMBLE.size + header_length)
+
+    @property
+    def model_version(self) -> str:
+        return self.header['model_version']
+
+    @property
+    def word_list(self) -> list[str]:
+        return self.header['word_list']
+
+    @property
+    def class_names(self) -> list[str]:
+        return self.header['class_names']
+
+    def arrays(self) -> dict:
+        """Return the weights as numpy arrays mapped copy-on-write from the bundle file."""
+        if self._arrays is None:
+            import numpy as np
+            self._arrays = {}
+            for name, spec in self.header['tensors'].items():
+                self._arrays[name] = np.memmap(
+                    self.path, dtype=spec['dtype'], mode='c',
+                    offset=self.data_offset + spec['offset'], shape=tuple(spec['shape']),
+                )
+        return self._arrays
+
+    def model_data(self):
+        """Return a ModelData holding the vocabulary and class names of the bundle."""
+        from data import LabelIndex, ModelData
+        from hashing_featurizer import featurizer_from_settings
+        model_data = ModelData(featurizer=featurizer_from_settings(self.header.get('featurizer')))
+        model_data.word_list = self.word_list
+        model_data.class_names = self.class_names
+        model_data.label_index = LabelIndex(self.header.get('label_index'))
+        return model_data
+
+    def model(self, sparse: bool = False):
+        """Return a Model whose parameters share memory with the mapped weights, or a sparse Model holding a transposed copy of the first layer."""
+        import torch
+        from model import Model
+        from net import SparseNet
+        model = Model(model_path='', input_size=self.header['input_size'], hidden_size=self.header['hidden_size'], output_size=self.header['output_size'])
+        arrays = self.arrays()
+        for name, parameter in model.model.named_parameters():
+            parameter.data = torch.from_numpy(arrays[name])
+        if sparse:
+            model.model = SparseNet.from_net(model.model)
+            model.sparse = True
+        model._version = self.model_version
+        return model
+
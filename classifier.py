@@ -0,0 +1,238 @@
+# classify many transaction descriptions at once with a trained model
+# torch and pandas are only imported once a model or a statement is actually used
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from bundle import ModelBundle
+from data import normalize_description
+from log import get_logger
+from metrics import metrics
+from prediction_cache import PredictionCache
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from data import ModelData
+    from model import Model, TrainingReport
+    from numpy_net import NumpyNet
+
+logger = get_logger('classifier')
+
+# torch runs the model as trained; sparse runs it as a SparseNet on the ids of the words of
+# each description; numpy runs the same weights without importing torch
+ENGINES = ('torch', 'sparse', 'numpy')
+
+
+class Classifier:
+    """A class for classifying transaction descriptions in bulk."""
+
+    def __init__(self, model_data: ModelData, model: Model = None, batch_size: int = 1024, bundle: ModelBundle = None,
+                 cache: PredictionCache = None, engine: str = 'torch'):
+        """Initialize the Classifier class."""
+        if engine not in ENGINES:
+            raise ValueError(f'Unknown engine {engine}, expected one of {ENGINES}')
+        if engine == 'sparse' and model is not None and not model.sparse:
+            raise ValueError('The sparse engine needs a Model(sparse=True)')
+        self.model_data = model_data
+        self.model = model
+        self.batch_size = batch_size
+        self.bundle = bundle
+        self.cache = cache
+        self.engine = engine
+        self._numpy_net = None
+        self._numpy_net_version = None
+
+    @classmethod
+    def from_bundle(cls, path: str, batch_size: int = 1024, cache: PredictionCache = None,
+                    engine: str = 'torch') -> 'Classifier':
+        """Create a Classifier from a model bundle, deferring the weights until the first prediction."""
+        bundle = ModelBundle.load(path)
+        return cls(bundle.model_data(), batch_size=batch_size, bundle=bundle, cache=cache, engine=engine)
+
+    @property
+    def model(self) -> Model:
+        if self._model is None and self.bundle is not None:
+            self._model = self.bundle.model(sparse=self.engine == 'sparse')
+        return self._model
+
+    @model.setter
+    def model(self, model: Model):
+        self._model = model
+
+    @property
+    def model_version(self) -> str:
+        # a bundle knows its version without loading the weights
+        if self._model is None and self.bundle is not None:
+            return self.bundle.model_version
+        return self.model.version
+
+    @property
+    def numpy_net(self) -> NumpyNet:
+        """The weights of the model as a NumpyNet, rebuilt whenever the model changes."""
+        from numpy_net import NumpyNet
+
+        model_version = self.model_version
+        if self._numpy_net is None or self._numpy_net_version != model_version:
+            if self._model is None and self.bundle is not None:
+                self._numpy_net = NumpyNet.from_bundle(self.bundle)
+            else:
+                self._numpy_net = self.model.numpy_net()
+            self._numpy_net_version = model_version
+        return self._numpy_net
+
+    def predict(self, descriptions: list[str], k: int = 1) -> list[list[tuple[str, float]]]:
+        """Run the network over descriptions, returning the top k (class name, confidence) pairs for each."""
+        results = []
+        for start in range(0, len(descriptions), self.batch_size):
+            batch = descriptions[start:start + self.batch_size]
+            if self.engine == 'numpy':
+                with metrics.stage('featurize', len(batch)):
+                    crow_indices, col_indices = self.model_data.featurize_rows(batch)
+                with metrics.stage('predict', len(batch)):
+                    confidences, indices = self.numpy_net.predict_rows(crow_indices, col_indices, k)
+            elif self.engine == 'sparse':
+                with metrics.stage('featurize', len(batch)):
+                    crow_indices, col_indices = self.model_data.featurize_rows(batch)
+                confidences, indices = self.model.predict_rows(crow_indices, col_indices, k=k, batch_size=self.batch_size)
+            else:
+                with metrics.stage('featurize', len(batch)):
+                    X = self.model_data.transform(batch).to_dense()
+                confidences, indices = self.model.predict_batch(X, k=k, batch_size=self.batch_size)
+            for row_confidences, row_indices in zip(confidences.tolist(), indices.tolist()):
+                results.append([
+                    (self.model_data.class_names[index], confidence)
+                    for index, confidence in zip(row_indices, row_confidences)
+                ])
+        return results
+
+    def classify_many(self, descriptions, k: int = 1) -> list[list[tuple[str, float]]]:
+        """Return the top k (class name, confidence) pairs for each description.
+
+        Descriptions a person has already labeled are answered from the label index with
+        full confidence; the rest come from the cache or, failing that, the network."""
+        descriptions = list(descriptions)
+        results = [self.labeled(description, k) for description in descriptions]
+
+        model_version = self.model_version if self.cache is not None else None
+        if self.cache is not None:
+            for index, description in enumerate(descriptions):
+                if results[index] is None:
+                    results[index] = self.cache.get(model_version, description, k)
+
+        # rows left, by normalized description, so repeats within the call are predicted once
+        missing = {}
+        for index, result in enumerate(results):
+            if result is None:
+                missing.setdefault(normalize_description(descriptions[index]), []).append(index)
+        metrics.count('classified', len(descriptions))
+        metrics.count('predicted', len(missing))
+        groups = list(missing.values())
+        predictions = self.predict([descriptions[indices[0]] for indices in groups], k)
+        for indices, prediction in zip(groups, predictions):
+            for index in indices:
+                results[index] = prediction
+            if self.cache is not None:
+                self.cache.put(model_version, descriptions[indices[0]], k, prediction)
+        return results
+
+    def labeled(self, description: str, k: int = 1) -> list[tuple[str, float]] | None:
+        """Return the known label of description as a top k prediction, or None if it has not been labeled."""
+        label = self.model_data.label_index.get(description)
+        if label is None:
+            return None
+        others = [class_name for class_name in self.model_data.class_names if class_name != label]
+        return [(label, 1.0)] + [(class_name, 0.0) for class_name in others[:k - 1]]
+
+    def check_history(self, history: ModelData):
+        """Raise ValueError unless history was featurized like the model: its words and classes must be
+        the first columns and classes of the model, and its featurizer the same."""
+        def settings(model_data):
+            return model_data.featurizer.settings() if model_data.featurizer else None
+
+        if settings(history) != settings(self.model_data):
+            raise ValueError(f'The history was featurized with {settings(history)}, the model with {settings(self.model_data)}')
+        if history.featurizer is None:
+            words = list(self.model_data.word_list)
+            if list(history.word_list) != words[:len(history.word_list)]:
+                raise ValueError('The words of the history are not the first words of the model, so its columns would not line up')
+        classes = list(self.model_data.class_names)
+        if list(history.class_names) != classes[:len(history.class_names)]:
+            raise ValueError('The classes of the history are not the first classes of the model')
+
+    def update(self, raw_data: pd.DataFrame, history: ModelData = None, replay_size: int = 256, seed: int = None,
+               **train_kwargs) -> TrainingReport:
+        """Fine-tune the model on newly labeled rows instead of retraining it from scratch.
+
+        New words and classes in raw_data grow the vocabulary and the network, keeping the learned
+        weights. The model is then trained on the new rows plus up to replay_size rows sampled from
+        history, the training set the model was originally trained on, so it does not forget them.
+        history must be featurized like the model (see check_history). Rows without a class are left out.
+
+        Returns: report (TrainingReport)"""
+        import torch
+
+        if history is not None:
+            self.check_history(history)
+        labeled = raw_data['Class'].notna() & (raw_data['Class'].astype(str).str.strip() != '')
+        raw_data = raw_data[labeled]
+        if raw_data.empty:
+            raise ValueError('No labeled rows to update the model with')
+        new_words, new_classes = self.model_data.extend(raw_data)
+        self.model.expand(self.model_data.input_size, len(self.model_data.class_names))
+
+        class_index = {class_name: index for index, class_name in enumerate(self.model_data.class_names)}
+        X = self.model_data.transform(raw_data['Description']).to_dense()
+        labels = torch.tensor([class_index[class_name] for class_name in raw_data['Class']])
+        if history is not None and history.X is not None and replay_size:
+            X_replay, labels_replay = history.sample(replay_size, self.model_data.input_size, seed)
+            X = torch.cat([X, X_replay])
+            labels = torch.cat([labels, labels_replay])
+        y = torch.nn.functional.one_hot(labels, len(self.model_data.class_names)).float()
+
+        train_kwargs.setdefault('epochs', 50)
+        train_kwargs.setdefault('patience', 5)
+        report = self.model.train(X, y, seed=seed, **train_kwargs)
+        logger.info(f'Updated with {len(raw_data)} new rows, {len(new_words)} new words and {len(new_classes)} new classes')
+        return report
+
+    def classify(self, description: str, k: int = 1) -> list[tuple[str, float]]:
+        """Return the top k (class name, confidence) pairs for one description."""
+        return self.classify_many([description], k)[0]
+
+    def classify_frame(self, df: pd.DataFrame, k: int = 1, description_column: str = 'Description') -> pd.DataFrame:
+        """Return a copy of df with the top k classes and their confidences appended as columns."""
+        k = min(k, len(self.model_data.class_names))
+        predictions = self.classify_many(df[description_column].astype(str), k)
+        df = df.copy()
+        for rank in range(k):
+            suffix = '' if rank == 0 else f' {rank + 1}'
+            df['Class' + suffix] = [prediction[rank][0] for prediction in predictions]
+            df['Confidence' + suffix] = [prediction[rank][1] for prediction in predictions]
+        return df
+
+    def classify_stream(self, path: str, k: int = 1, description_column: str = 'Description', chunksize: int = 10000):
+        """Yield the statement at path as classified chunks of at most chunksize rows."""
+        import pandas as pd
+
+        reader = iter(pd.read_csv(path, chunksize=chunksize))
+        while True:
+            with metrics.stage('read_csv') as stage:
+                chunk = next(reader, None)
+                stage.rows = 0 if chunk is None else len(chunk)
+            if chunk is None:
+                return
+            with metrics.stage('classify', len(chunk)):
+                classified = self.classify_frame(chunk, k, description_column)
+            yield classified
+
+    def classify_csv(self, input_path: str, output_path: str, k: int = 1, description_column: str = 'Description', chunksize: int = 10000) -> int:
+        """Classify the statement at input_path into output_path without holding more than one chunk in memory.
+
+        Returns: rows (int), the number of rows written"""
+        rows = 0
+        with open(output_path, 'w', newline='') as f:
+            for index, chunk in enumerate(self.classify_stream(input_path, k, description_column, chunksize)):
+                with metrics.stage('write_csv', len(chunk)):
+                    chunk.to_csv(f, index=False, header=index == 0)
+                rows += len(chunk)
+        return rows
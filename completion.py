@@ -0,0 +1,61 @@
+# case-insensitive prefix completion of class names, shared by the readline prompts and the gui
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+
+
+class CompletionIndex:
+    """A case-insensitive prefix index over labels.
+
+    Labels are kept sorted by their lower-cased form, so the completions of a prefix are
+    the slice between two binary searches instead of a scan of every label, and adding a
+    label is a single insertion.
+    """
+
+    def __init__(self, labels=()):
+        """Initialize the CompletionIndex class."""
+        self._keys = []
+        self._labels = set()
+        self.update(labels)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, label: str) -> bool:
+        return label in self._labels
+
+    def add(self, label: str) -> bool:
+        """Add a label, returning False if it was already indexed."""
+        if label in self._labels:
+            return False
+        self._labels.add(label)
+        insort(self._keys, (label.lower(), label))
+        return True
+
+    def update(self, labels):
+        """Add many labels."""
+        for label in labels:
+            self.add(label)
+
+    def complete(self, prefix: str, limit: int | None = None) -> list[str]:
+        """Return the labels starting with prefix, ignoring case, in alphabetical order."""
+        prefix = prefix.lower()
+        start = bisect_left(self._keys, (prefix,))
+        # every key starting with prefix sorts before prefix followed by the largest character
+        end = bisect_left(self._keys, (prefix + '\U0010ffff',), start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return [label for _, label in self._keys[start:end]]
+
+    def completer(self):
+        """Return a readline completer over this index, computing the matches once per tab press.
+
+        Returns: complete (function) taking (text, state)"""
+        matches = []
+
+        def complete(text, state):
+            if state == 0:
+                matches[:] = self.complete(text)
+            return matches[state] if state < len(matches) else None
+
+        return complete
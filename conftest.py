@@ -0,0 +1,26 @@
+import pytest
+import torch
+
+from data import ModelData
+from model import Model
+
+
+@pytest.fixture
+def model_data() -> ModelData:
+    model_data = ModelData()
+    model_data.word_list = ['TIM', 'HORTONS', 'SHELL', 'GAS', 'STATION']
+    model_data.class_names = ['Coffee', 'Gas', 'Subscriptions']
+    return model_data
+
+@pytest.fixture
+def model(model_data) -> Model:
+    torch.manual_seed(0)
+    return Model(model_path='', input_size=len(model_data.word_list), hidden_size=8, output_size=len(model_data.class_names))
+
+@pytest.fixture
+def trained_model(model_data, model) -> Model:
+    # tells TIM HORTONS (Coffee) from SHELL GAS (Gas), and has never seen a Subscription
+    X = model_data.transform(['TIM HORTONS', 'SHELL GAS'] * 8).to_dense()
+    y = torch.tensor([[1, 0, 0], [0, 1, 0]] * 8, dtype=torch.float)
+    model.train(X, y, epochs=300, learning_rate=1e-2, validation_split=0.0, seed=0)
+    return model
@@ -5,30 +5,56 @@ import tkinter
 from tkinter import ttk
 from typing import Union
 
+from completion import CompletionIndex
+from labeling_queue import LabelingQueue
+from log import logger
+from worker import TaskRunner
+
 class DescriptionLabeler:
     """A class for labeling charge descriptions."""
     categories = []
     current = 0
 
-    def __init__(self, charge_description_list: list[str], categories: list[str]=[]):
-        """Initialize the LabelClassifier class."""
-        self.charge_description_list = charge_description_list
-        self.labels = [""] * len(charge_description_list)
+    def __init__(self, charge_description_list: list[str] = None, categories: list[str]=[], label_index=None, classifier=None,
+                 near_duplicates: bool = False):
+        """Initialize the LabelClassifier class.
+
+        Repeats of a description are asked about once. If a classifier is given, the descriptions
+        it is least sure about come first. If a LabelIndex is given, every label is added to it
+        as soon as it is entered. With near_duplicates, descriptions that differ only by store
+        number or city are labeled together."""
+        charge_description_list = charge_description_list or []
+        if near_duplicates:
+            from near_duplicates import cluster_key
+            self.queue = LabelingQueue(charge_description_list, classifier, key=cluster_key(charge_description_list))
+        else:
+            self.queue = LabelingQueue(charge_description_list, classifier)
+        self.charge_description_list = self.queue.descriptions
+        self.labels = self.queue.labels
+        self.label_index = label_index
         
         if categories:
             self.categories = categories
  
     def get_current_description(self) -> str:
         """Return the current description."""
-        if self.current < len(self.charge_description_list):
-            return self.charge_description_list[self.current]
-        else:
-            return ""
+        return self.queue.current_description()
+
+    def add_descriptions(self, descriptions: list[str]):
+        """Add descriptions to label, such as the next chunk of a statement. Repeats of an already
+        labeled description are labeled straight away."""
+        self.queue.extend(descriptions)
+
+    def get_upcoming_descriptions(self, n: int) -> list[str]:
+        """Return the next n descriptions to label, starting with the current one."""
+        return self.queue.upcoming(n)
 
     def label(self, label: str):
-        """Label the current description. Move to the next description."""
-        self.labels[self.current] = label
-        self.current += 1
+        """Label the current description and its repeats. Move to the next description."""
+        for index in self.queue.label(label):
+            if self.label_index is not None:
+                self.label_index.add(self.charge_description_list[index], label)
+        self.current = self.queue.position
 
     def get_categories(self) -> list[str]:
         """Return the categories."""
@@ -44,28 +70,37 @@ class DescriptionLabeler:
 
 
 class AutocompleteEntry(ttk.Entry):
-    """A class for autocorrecting charge descriptions."""
+    """A class for autocorrecting charge descriptions.
+
+    Completions come from a CompletionIndex and are shown in one listbox that is updated
+    in place, a short delay after the last keystroke."""
+    debounce_ms = 150
+
     def __init__(self, label_list: list[str], root: Union[ttk.Widget, None] = None, **kwargs):
         """Initialize the Autocorrect class."""
         self.label_list = label_list
+        self.index = CompletionIndex(label_list)
 
         self.var = tkinter.StringVar()
-        self.var.trace('w', self.changed)
         self.var.set("")
         self.listbox = None
+        self.listbox_visible = False
         self.complete_list = []
+        self._pending = None
 
         super().__init__(root, textvariable=self.var)
+        self.var.trace('w', self.changed)
         self.bind("<Down>", self.down)
         self.bind("<Up>", self.up)
 
     def set_label_list(self, label_list: list[str]):
         """Set the list of charge descriptions."""
         self.label_list = label_list
+        self.index = CompletionIndex(label_list)
 
     def add_label(self, label: str):
         """Add a label to the list of labels."""
-        if label not in self.label_list:
+        if self.index.add(label) and label not in self.label_list:
             self.label_list.append(label)
 
     def get_label_list(self) -> list[str]:
@@ -74,13 +109,13 @@ class AutocompleteEntry(ttk.Entry):
 
     def down(self, event):
         """Move down the listbox."""
-        if self.listbox:
+        if self.listbox_visible:
             self.listbox.focus_set()
             self.listbox.select_set(0)
 
     def up(self, event):
         """Move up the listbox."""
-        if self.listbox:
+        if self.listbox_visible:
             self.listbox.focus_set()
             self.listbox.select_set(tkinter.END)
 
@@ -89,42 +124,59 @@ class AutocompleteEntry(ttk.Entry):
         self.focus_set()
 
     def changed(self, name, index, mode):
+        """Schedule an update of the list of possible completions, replacing any pending one."""
+        if self._pending is not None:
+            self.after_cancel(self._pending)
+        self._pending = self.after(self.debounce_ms, self.refresh)
+
+    def refresh(self):
         """Update the list of possible completions."""
-        if self.var.get():
-            matches = [word for word in self.label_list if word.lower().startswith(self.var.get().lower())]
-            if matches:
-                self.complete_list = matches
-                self.listbox_update()
-            else:
-                if self.listbox:
-                    self.listbox.destroy()
-                    self.listbox = None
+        self._pending = None
+        text = self.var.get()
+        self.complete_list = self.index.complete(text) if text else []
+        if self.complete_list:
+            self.listbox_update()
         else:
-            if self.listbox:
-                self.listbox.destroy()
-                self.listbox = None
+            self.listbox_hide()
 
     def listbox_update(self):
         """Update the listbox."""
-        if self.listbox:
-            self.listbox.destroy()
-            self.listbox = None
-
-        if self.var.get():
-            self.listbox = tkinter.Listbox(self.master, height=int(1.2*len(self.complete_list)))
+        if self.listbox is None:
+            self.listbox = tkinter.Listbox(self.master)
             self.listbox.bind("<Double-Button-1>", self.selection)
             self.listbox.bind("<Return>", self.selection)
-            self.listbox.place(x=self.winfo_x(), y=self.winfo_y() + self.winfo_height())
 
-            for item in self.complete_list:
-                self.listbox.insert(tkinter.END, item)
+        self.listbox.delete(0, tkinter.END)
+        self.listbox.insert(tkinter.END, *self.complete_list)
+        self.listbox.configure(height=min(len(self.complete_list), 10))
+        self.listbox.place(x=self.winfo_x(), y=self.winfo_y() + self.winfo_height())
+        self.listbox_visible = True
+
+    def listbox_hide(self):
+        """Hide the listbox, keeping it for the next completions."""
+        if self.listbox_visible:
+            self.listbox.place_forget()
+            self.listbox_visible = False
 
     def selection(self, event):
         """Select the item from the listbox."""
-        if self.listbox:
+        if self.listbox_visible:
             self.var.set(self.listbox.get(tkinter.ACTIVE))
+            # the chosen label needs no completions of its own
+            if self._pending is not None:
+                self.after_cancel(self._pending)
+                self._pending = None
+            self.listbox_hide()
+
+    def destroy(self):
+        """Cancel any pending update and destroy the entry and its listbox."""
+        if self._pending is not None:
+            self.after_cancel(self._pending)
+            self._pending = None
+        if self.listbox is not None:
             self.listbox.destroy()
             self.listbox = None
+        super().destroy()
 
     def get(self):
         """Return the current text."""
@@ -136,19 +188,34 @@ class AutocompleteEntry(ttk.Entry):
 
 
 class DescriptionLabelerGUI(ttk.Frame):
-    """A class for classifying labels for a list of descriptions."""
+    """A class for classifying labels for a list of descriptions.
 
-    def __init__(self,  description_labeler: DescriptionLabeler, root: Union[ttk.Widget, None] = None):
+    Given a classifier, the predictions for the next few descriptions are computed on a
+    worker thread and shown as suggestions, so the window never waits on the model."""
+    # number of upcoming descriptions to predict ahead of time
+    prefetch = 20
+
+    def __init__(self,  description_labeler: DescriptionLabeler, root: Union[ttk.Widget, None] = None,
+                 classifier=None, runner: TaskRunner = None):
         """Initialize the DescriptionLabelerGUI class."""
         super().__init__(root)
 
         self.description_labeler = description_labeler
+        self.classifier = classifier
+        # a runner passed in is shared with the rest of the window, so only our own is shut down
+        self._own_runner = runner is None and classifier is not None
+        self.runner = TaskRunner(self) if self._own_runner else runner
+        self.suggestions = {}
+        self._prefetching = None
 
         self.description = ttk.Label(self, text="")
         self.description.pack()
 
+        self.suggestion = ttk.Label(self, text="")
+        self.suggestion.pack()
+
         self.label = tkinter.StringVar()
-        self.auto_complete_entry = AutocompleteEntry(self.description_labeler.get_categories())
+        self.auto_complete_entry = AutocompleteEntry(self.description_labeler.get_categories(), self)
         # self.auto_complete_entry = tkinter.Entry(self, textvariable=self.label)
         self.auto_complete_entry.pack()
 
@@ -157,6 +224,19 @@ class DescriptionLabelerGUI(ttk.Frame):
 
         self.update_description()
 
+    def add_descriptions(self, descriptions: list[str]):
+        """Add descriptions to label, showing the first one if the labeler was waiting for more."""
+        waiting = not self.description_labeler.get_current_description()
+        self.description_labeler.add_descriptions(descriptions)
+        if waiting:
+            self.update_description()
+        else:
+            self.prefetch_predictions()
+
+    def display_next(self) -> bool:
+        """Show the next description to label."""
+        return self.update_description()
+
     def enter_label(self):
         """Enter the label."""
         label = self.auto_complete_entry.get()
@@ -165,6 +245,7 @@ class DescriptionLabelerGUI(ttk.Frame):
         if label not in self.description_labeler.get_categories():
             self.description_labeler.categories.append(label)
         self.description_labeler.label(self.auto_complete_entry.get())
+        self.event_generate("<<LabelEntered>>")
         self.auto_complete_entry.set("")
         self.auto_complete_entry.focus_set()
         
@@ -175,18 +256,66 @@ class DescriptionLabelerGUI(ttk.Frame):
         """Update the description."""
         description = self.description_labeler.get_current_description()
         if description:
+            if not self.button.winfo_manager():
+                self.auto_complete_entry.pack()
+                self.button.pack()
             self.description["text"] = description
+            self.show_suggestion()
+            self.prefetch_predictions()
             return True
         else:
             return False
 
+    def show_suggestion(self):
+        """Show the predicted label of the current description, if it has been computed."""
+        prediction = self.suggestions.get(self.description_labeler.get_current_description())
+        if prediction:
+            label, confidence = prediction[0]
+            self.suggestion["text"] = f"Suggested: {label} ({confidence:.0%})"
+        else:
+            self.suggestion["text"] = ""
+
+    def prefetch_predictions(self):
+        """Predict the upcoming descriptions on the worker, one batch at a time."""
+        if self.classifier is None or self._prefetching is not None:
+            return
+        upcoming = [description for description in self.description_labeler.get_upcoming_descriptions(self.prefetch)
+                    if description not in self.suggestions]
+        if upcoming:
+            self._prefetching = self.runner.submit(self._predict, upcoming, on_done=self.suggestions_ready,
+                                                   on_error=self.suggestions_failed)
+
+    def _predict(self, task, descriptions: list[str]) -> dict:
+        # runs on the worker thread
+        return dict(zip(descriptions, self.classifier.classify_many(descriptions)))
+
+    def suggestions_ready(self, suggestions: dict):
+        """Keep the predictions made on the worker and show the current one."""
+        self._prefetching = None
+        self.suggestions.update(suggestions)
+        self.show_suggestion()
+        self.prefetch_predictions()
+
+    def suggestions_failed(self, error: Exception):
+        """Stop prefetching after the model fails, leaving labeling unaffected."""
+        logger.error(f'Could not predict upcoming descriptions: {error!r}')
+        self.classifier = None
+        self._prefetching = None
+
     # an event for when the labels are complete
     def on_complete(self):
-        # remove button and text entry
-        self.button.destroy()
-        self.auto_complete_entry.destroy()
+        # hide button and text entry until more descriptions are added
+        self.button.pack_forget()
+        self.auto_complete_entry.pack_forget()
 
         self.description["text"] = "Labels complete!"
+        self.suggestion["text"] = ""
+
+    def destroy(self):
+        """Stop the worker, dropping any prediction still running."""
+        if self._own_runner:
+            self.runner.shutdown()
+        super().destroy()
     
 if __name__ == "__main__":
     root = ttk.Frame(width=500, height=5000, padding=10, relief=tkinter.RIDGE, borderwidth=5, takefocus=True, name="root", class_="root", style="root.TFrame", cursor="arrow")
@@ -7,6 +7,14 @@ from tkinter import ttk, dnd, filedialog
 import pandas as pd
 
 from description_labeler import DescriptionLabeler, DescriptionLabelerGUI
+from virtual_listbox import VirtualListbox
+from worker import TaskRunner
+
+# number of statement rows read into memory at a time
+CHUNKSIZE = 10000
+
+# the column holding the transaction description for each bank
+DESCRIPTION_COLUMNS = {"Simplii": " Transaction Details"}
 
 class App(tk.Tk):
     def __init__(self):
@@ -71,13 +79,53 @@ class FileFrame(ttk.Frame):
 
 # create an application window that displays the file frame
 
+class StatementRows:
+    """A read-only view of the descriptions read so far and their labels, for the statement list."""
+
+    def __init__(self, description_labeler: DescriptionLabeler):
+        self.description_labeler = description_labeler
+
+    def __len__(self) -> int:
+        return len(self.description_labeler.charge_description_list)
+
+    def __getitem__(self, index: int) -> tuple[str, str]:
+        return self.description_labeler.charge_description_list[index], self.description_labeler.labels[index]
+
+
+def format_statement_row(row: tuple[str, str]) -> str:
+    description, label = row
+    return f"{description}  [{label}]" if label else description
+
+
+def read_statement(task, file: str, description_column: str) -> int:
+    """Read the description column of a statement on a worker thread, sending each chunk as progress."""
+    rows = 0
+    for df in pd.read_csv(file, usecols=[description_column], chunksize=CHUNKSIZE):
+        if task.cancelled():
+            break
+        rows += len(df)
+        task.progress(df)
+    return rows
+
+
 class App(ttk.Frame):
     def __init__(self):
         super().__init__()
 
+        # long operations run here so the window keeps responding
+        self.runner = TaskRunner(self)
+        self.loading = None
+        self.rows_read = 0
+
         self.file_frame = FileFrame()
         description_labeler = DescriptionLabeler() 
-        self.label_frame = DescriptionLabelerGUI(description_labeler, root=self)
+        self.label_frame = DescriptionLabelerGUI(description_labeler, root=self, runner=self.runner)
+        # every row of the statement, though only the visible ones are ever put in Tk
+        self.statement_list = VirtualListbox(self, data=StatementRows(description_labeler), format=format_statement_row)
+        self.label_frame.bind("<<LabelEntered>>", lambda event: self.statement_list.refresh())
+
+        self.status = ttk.Label(self, text="")
+        self.cancel_button = ttk.Button(self, text="Cancel", command=self.cancel_loading)
 
         self.file_frame.pack()
 
@@ -89,18 +137,57 @@ class App(ttk.Frame):
         file = self.file_frame.get_file()
         type = self.file_frame.get_type()
 
-        df = pd.read_csv(file)
+        # only the description column is kept, one chunk at a time, read off the main thread;
+        # each chunk can be labeled as soon as it arrives
+        description_column = DESCRIPTION_COLUMNS.get(type, "Description")
+        self.rows_read = 0
+        self.loading = self.runner.submit(
+            read_statement, file, description_column,
+            on_progress=lambda df: self.chunk_read(type, df),
+            on_done=self.statement_read,
+            on_error=self.statement_failed,
+        )
+
+        self.file_frame.pack_forget()
+        self.status["text"] = "Reading statement..."
+        self.status.pack()
+        self.cancel_button.pack()
+
+        self.label_frame.display_next()
+        self.label_frame.pack()
+        self.statement_list.pack(fill="both", expand=True)
+
+    def chunk_read(self, type: str, df):
         if type == "Simplii":
             self.simplii(df)
         elif type == "BMO":
             self.bmo(df)
         else:
             self.other(df)
-
-        self.file_frame.pack_forget()
-        
-        self.label_frame.display_next()
-        self.label_frame.pack()
+        self.rows_read += len(df)
+        self.status["text"] = f"Read {self.rows_read} rows..."
+        self.statement_list.refresh()
+
+    def statement_read(self, rows: int):
+        self.loading = None
+        self.status["text"] = f"Read {rows} rows"
+        self.cancel_button.pack_forget()
+
+    def statement_failed(self, error: Exception):
+        self.loading = None
+        self.status["text"] = f"Could not read statement: {error}"
+        self.cancel_button.pack_forget()
+
+    def cancel_loading(self):
+        if self.loading is not None:
+            self.loading.cancel()
+            self.loading = None
+        self.status["text"] = f"Stopped after {self.rows_read} rows"
+        self.cancel_button.pack_forget()
+
+    def destroy(self):
+        self.runner.shutdown()
+        super().destroy()
 
     def simplii(self, df):
         self.label_frame.add_descriptions(df[" Transaction Details"].tolist())
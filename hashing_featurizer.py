@@ -0,0 +1,84 @@
+# featurize descriptions without a vocabulary by hashing words and character n-grams
+# into a fixed number of columns, so the input size never changes between retrains
+from __future__ import annotations
+
+import zlib
+from typing import TYPE_CHECKING
+
+from data import is_keyword, tokenize
+
+if TYPE_CHECKING:
+    import torch
+
+
+class HashingFeaturizer:
+    """A featurizer that hashes the words of a description and their character n-grams into n_features columns.
+
+    Unseen merchants still share n-grams with known ones, and memory does not grow with
+    the number of distinct descriptions. crc32 is used rather than hash() so columns are
+    stable across processes and runs.
+    """
+
+    kind = 'hashing'
+
+    def __init__(self, n_features: int = 2 ** 14, ngram_range: tuple[int, int] = (3, 4), words: bool = True):
+        """Initialize the HashingFeaturizer class."""
+        self.n_features = n_features
+        self.ngram_range = tuple(ngram_range)
+        self.words = words
+
+    def tokens(self, description: str) -> list[str]:
+        """Return the word and character n-gram tokens of a description."""
+        tokens = []
+        for word in tokenize(description):
+            word = word.upper()
+            if not is_keyword(word):
+                continue
+            if self.words:
+                tokens.append('w:' + word)
+            padded = f'<{word}>'
+            for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+                for start in range(len(padded) - n + 1):
+                    tokens.append('c:' + padded[start:start + n])
+        return tokens
+
+    def featurize_rows(self, descriptions) -> tuple[list[int], list[int]]:
+        """
+        Hash each description to the sorted columns of its tokens
+
+        Returns: crow_indices (list), col_indices (list) in CSR layout"""
+        crow_indices = [0]
+        col_indices = []
+        for description in descriptions:
+            columns = {zlib.crc32(token.encode()) % self.n_features for token in self.tokens(description)}
+            col_indices.extend(sorted(columns))
+            crow_indices.append(len(col_indices))
+        return crow_indices, col_indices
+
+    def transform(self, descriptions) -> torch.Tensor:
+        """
+        Create a hashed feature row for each description
+
+        Returns: X (torch.Tensor), sparse CSR of shape (len(descriptions), n_features)"""
+        import torch
+
+        crow_indices, col_indices = self.featurize_rows(descriptions)
+        return torch.sparse_csr_tensor(
+            torch.tensor(crow_indices, dtype=torch.int64),
+            torch.tensor(col_indices, dtype=torch.int64),
+            torch.ones(len(col_indices), dtype=torch.float),
+            size=(len(crow_indices) - 1, self.n_features),
+        )
+
+    def settings(self) -> dict:
+        """Return the settings needed to rebuild this featurizer."""
+        return {'kind': self.kind, 'n_features': self.n_features, 'ngram_range': list(self.ngram_range), 'words': self.words}
+
+
+def featurizer_from_settings(settings: dict | None) -> HashingFeaturizer | None:
+    """Rebuild a featurizer from HashingFeaturizer.settings, or None for the vocabulary featurizer."""
+    if not settings:
+        return None
+    if settings['kind'] != HashingFeaturizer.kind:
+        raise ValueError(f'Unknown featurizer {settings["kind"]}')
+    return HashingFeaturizer(settings['n_features'], settings['ngram_range'], settings['words'])
@@ -0,0 +1,98 @@
+# the order in which descriptions are shown to a person for labeling
+from __future__ import annotations
+
+import math
+from typing import Callable
+
+from data import normalize_description
+
+STRATEGIES = ('entropy', 'margin')
+
+
+def uncertainty(probabilities: list[float], strategy: str = 'entropy') -> float:
+    """Return how unsure a prediction is, higher meaning less sure.
+
+    entropy is the Shannon entropy of the class probabilities; margin is one minus the
+    gap between the two most likely classes."""
+    if strategy == 'entropy':
+        return -sum(p * math.log(p) for p in probabilities if p > 0)
+    elif strategy == 'margin':
+        top = sorted(probabilities, reverse=True) + [0.0, 0.0]
+        return 1.0 - (top[0] - top[1])
+    raise ValueError(f'Unknown strategy {strategy}, expected one of {STRATEGIES}')
+
+
+class LabelingQueue:
+    """A queue of descriptions to label that asks about each group of identical descriptions once.
+
+    Descriptions are grouped by key (the normalized description by default). Given a
+    classifier, the groups the model is least sure about come first; otherwise they keep
+    the order in which they first appear.
+    """
+
+    def __init__(self, descriptions: list[str], classifier=None, strategy: str = 'entropy',
+                 key: Callable[[str], str] = normalize_description):
+        """Initialize the LabelingQueue class."""
+        self.key = key
+        self.descriptions = []
+        self.labels = []
+        self.groups = []
+        self.position = 0
+        self._groups_by_key = {}
+        self.extend(descriptions)
+
+        if classifier is not None and self.groups:
+            self.order_by_uncertainty(classifier, strategy)
+
+    def __len__(self) -> int:
+        """Return the number of groups left to label."""
+        return len(self.groups) - self.position
+
+    def extend(self, descriptions: list[str]):
+        """Add descriptions to the queue.
+
+        A description joins the group of an earlier one with the same key, taking its label
+        straight away if that group has already been labeled; otherwise it starts a new group
+        at the end of the queue."""
+        for description in descriptions:
+            index = len(self.descriptions)
+            self.descriptions.append(description)
+            group = self._groups_by_key.setdefault(self.key(description), [])
+            if not group:
+                self.groups.append(group)
+            group.append(index)
+            self.labels.append(self.labels[group[0]] if len(group) > 1 else '')
+
+    def order_by_uncertainty(self, classifier, strategy: str = 'entropy'):
+        """Sort the remaining groups so the least certain predictions come first."""
+        remaining = self.groups[self.position:]
+        k = len(classifier.model_data.class_names)
+        predictions = classifier.predict([self.descriptions[group[0]] for group in remaining], k)
+        scores = [uncertainty([confidence for _, confidence in prediction], strategy) for prediction in predictions]
+        order = sorted(range(len(remaining)), key=lambda i: -scores[i])
+        self.groups[self.position:] = [remaining[i] for i in order]
+
+    def current(self) -> list[int] | None:
+        """Return the indices of the group to label next, or None when every group is labeled."""
+        if self.position < len(self.groups):
+            return self.groups[self.position]
+        return None
+
+    def upcoming(self, n: int) -> list[str]:
+        """Return the descriptions shown for the next n groups, starting with the current one."""
+        return [self.descriptions[group[0]] for group in self.groups[self.position:self.position + n]]
+
+    def current_description(self) -> str:
+        """Return the description shown for the group to label next."""
+        group = self.current()
+        return self.descriptions[group[0]] if group else ''
+
+    def label(self, label: str) -> list[int]:
+        """Label every description of the current group and move to the next one.
+
+        Returns: indices (list) of the descriptions labeled"""
+        group = self.current()
+        for index in group:
+            self.labels[index] = label
+        self.position += 1
+        return group
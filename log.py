@@ -1,22 +1,112 @@
+# the one logger configuration every module shares: records are put on a queue by the
+# calling thread and formatted and written by a background thread, so a log call in a hot
+# loop never waits on the console or the disk. Nothing is opened or started until the
+# first record is logged.
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+import threading
+
+LOG_PATH = os.path.join('log', 'log.txt')
+# rotate the log file once it reaches MAX_BYTES, keeping BACKUP_COUNT old files
+MAX_BYTES = 5 * 2 ** 20
+BACKUP_COUNT = 3
+FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class LazyRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """A RotatingFileHandler that creates its folder and opens its file on the first record instead of at import."""
+
+    def __init__(self, filename: str, **kwargs):
+        super().__init__(filename, delay=True, **kwargs)
+
+    def _open(self):
+        # check if log folder exists
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+class BackgroundQueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler whose QueueListener, writing records to targets, starts with the first record."""
+
+    def __init__(self, targets: list[logging.Handler]):
+        super().__init__(queue.SimpleQueue())
+        self.targets = targets
+        self.listener = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the background thread, if it is not running yet."""
+        with self._lock:
+            if self.listener is None:
+                self.listener = logging.handlers.QueueListener(self.queue, *self.targets, respect_handler_level=True)
+                self.listener.start()
+                atexit.register(self.stop)
+
+    def stop(self):
+        """Write every queued record and stop the background thread; the next record starts it again."""
+        with self._lock:
+            if self.listener is not None:
+                self.listener.stop()
+                self.listener = None
+                atexit.unregister(self.stop)
+
+    def emit(self, record: logging.LogRecord):
+        if self.listener is None:
+            self.start()
+        super().emit(record)
+
+    def close(self):
+        self.stop()
+        for target in self.targets:
+            target.close()
+        super().close()
+
 
 logger = logging.getLogger(__name__)
-# log to console
-logger.addHandler(logging.StreamHandler())
-
-# check if log folder exists
-if not os.path.exists('log'):
-    os.mkdir('log')
-# log to file
-logger.addHandler(logging.FileHandler('log/log.txt'))
+
+
+def configure(path: str = LOG_PATH, max_bytes: int = MAX_BYTES, backup_count: int = BACKUP_COUNT,
+              console: bool = True) -> BackgroundQueueHandler:
+    """Send the records of every module's logger to the console and a rotating file at path, replacing any earlier setup.
+
+    Returns: handler (BackgroundQueueHandler)"""
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+
+    formatter = logging.Formatter(FORMAT)
+    targets = []
+    # log to console
+    if console:
+        targets.append(logging.StreamHandler())
+    # log to file
+    if path:
+        targets.append(LazyRotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count))
+    for target in targets:
+        target.setFormatter(formatter)
+
+    handler = BackgroundQueueHandler(targets)
+    logger.addHandler(handler)
+    return handler
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Return the logger of a module, which shares the configuration of the main logger."""
+    return logger.getChild(name)
+
+
+def flush():
+    """Write every record logged so far."""
+    for handler in logger.handlers:
+        if isinstance(handler, BackgroundQueueHandler):
+            handler.stop()
+
+
+configure()
 if os.environ.get('DEBUG'):
     logger.setLevel(logging.DEBUG)
 else:
     logger.setLevel(logging.INFO)
-
-# set log format
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-for handler in logger.handlers:
-    handler.setFormatter(formatter)
-
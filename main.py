@@ -1,43 +1,152 @@
-import pandas as pd
-import torch
+import argparse
+import os
 
-from data import ModelData
-from model import Model
+from metrics import metrics
+
+# the classifier modules import torch and pandas, so they are only imported
+# once the arguments have been parsed and the work needs them
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Train the budget line classifier and classify transaction descriptions.')
+    parser.add_argument('--classify', metavar='STATEMENT', help='classify every row of a statement csv instead of prompting for descriptions')
+    parser.add_argument('--update', metavar='STATEMENT', help='fine-tune the --bundle model on a labeled statement csv (with a Class column) and save it back')
+    parser.add_argument('--replay-size', type=int, default=256, help='number of rows of --data replayed while updating')
+    parser.add_argument('--output', metavar='CSV', help='where to write the classified statement (default: <STATEMENT>_classified.csv)')
+    parser.add_argument('--top-k', type=int, default=1, help='number of candidate classes to write for each row')
+    parser.add_argument('--batch-size', type=int, default=1024, help='number of rows to featurize and predict at a time')
+    parser.add_argument('--chunksize', type=int, default=10000, help='number of statement rows to read into memory at a time')
+    parser.add_argument('--description-column', default='Description', help='statement column holding the transaction description')
+    parser.add_argument('--data', default='data/data.bin', help='path of the preprocessed training set (.bin, or a legacy .csv)')
+    parser.add_argument('--meta', default='meta_data.pkl', help='path of the vocabulary and class names')
+    parser.add_argument('--model', default='model.pth', help='path of the trained model weights')
+    parser.add_argument('--cache', metavar='PATH', help='keep predictions in a cache saved to PATH between runs')
+    parser.add_argument('--cache-size', type=int, default=100000, help='number of predictions the cache holds')
+    parser.add_argument('--metrics', nargs='?', const='', metavar='PATH', help='log the time and rows of each stage as JSON when done, also appending it to PATH if given (or set BLC_METRICS)')
+    parser.add_argument('--bundle', help='path of a model bundle, written after training and used instead of --meta and --model to classify')
+    parser.add_argument('--engine', choices=['torch', 'sparse', 'numpy'], default='torch', help='run the model with torch, with torch on the ids of the words of each description (sparse), or with numpy alone (with --bundle, torch is then never imported)')
+    parser.add_argument('--quantize', choices=['int8', 'float16'], help='classify with the weights stored as int8, for less memory and faster batches, or as float16, for less memory')
+    parser.add_argument('--export-numpy', metavar='NPZ', help='also write the trained weights as a numpy .npz file')
+    return parser.parse_args(argv)
+
+def classify_statement(args):
+    from classifier import Classifier
+    from data import ModelData
+    from prediction_cache import PredictionCache
+
+    # load the vocabulary and the trained model
+    cache = PredictionCache(args.cache_size, args.cache) if args.cache else None
+    if args.bundle:
+        classifier = Classifier.from_bundle(args.bundle, batch_size=args.batch_size, cache=cache, engine=args.engine)
+    else:
+        # only a bundle can be classified without torch
+        from model import Model
+
+        model_data = ModelData()
+        model_data.word_list, model_data.class_names = model_data.load_meta_data(args.meta)
+        model = Model(model_path=args.model, input_size=model_data.input_size, hidden_size=128, output_size=len(model_data.class_names),
+                      sparse=args.engine == 'sparse')
+        classifier = Classifier(model_data, model, batch_size=args.batch_size, cache=cache, engine=args.engine)
+    if args.quantize:
+        if args.engine == 'numpy':
+            raise SystemExit('--quantize needs the torch or sparse engine')
+        classifier.model = classifier.model.quantize(args.quantize)
+
+    output_path = args.output or os.path.splitext(args.classify)[0] + '_classified.csv'
+    rows = classifier.classify_csv(args.classify, output_path, k=args.top_k, description_column=args.description_column, chunksize=args.chunksize)
+    print(f'Classified {rows} rows into {output_path}')
+    if cache is not None:
+        cache.save()
+        print(f'Prediction cache: {cache.stats()}')
+        metrics.set('prediction_cache', cache.stats())
+
+def update_bundle(args):
+    import pandas as pd
+
+    from bundle import save_bundle
+    from classifier import Classifier
+    from data import ModelData
+
+    classifier = Classifier.from_bundle(args.bundle, batch_size=args.batch_size)
+    with metrics.stage('load_data'):
+        history = ModelData(data_path=args.data, meta_path=args.meta) if os.path.exists(args.data) else None
+    if history is not None:
+        try:
+            classifier.check_history(history)
+        except ValueError as error:
+            raise SystemExit(f'--data {args.data} cannot be replayed into --bundle {args.bundle}: {error}')
+    with metrics.stage('read_csv') as stage:
+        raw_data = pd.read_csv(args.update)
+        stage.rows = len(raw_data)
+    classifier.update(raw_data, history=history, replay_size=args.replay_size)
+    save_bundle(args.bundle, classifier.model, classifier.model_data)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.metrics is not None:
+        metrics.enable(args.metrics or None)
+    try:
+        run(args)
+    finally:
+        metrics.emit()
+
+def run(args):
+    if args.update:
+        if not args.bundle or not os.path.exists(args.bundle):
+            raise SystemExit('--update needs the --bundle of a trained model')
+        update_bundle(args)
+        return
+    if args.classify:
+        model_path = args.bundle or args.model
+        if not os.path.exists(model_path):
+            raise SystemExit(f'Model path {model_path} does not exist, train a model first')
+        classify_statement(args)
+        return
+
+    import pandas as pd
+    import torch
+
+    from bundle import save_bundle
+    from data import ModelData
+    from model import Model
 
-def main():
     # load the data
-    data_path='data/data.csv'
+    data_path = args.data
     meta_path = 'data/meta_data.pkl'
     model_path = 'data/model.pth'
 
     # model_data = ModelData(data_path, meta_path)
     # model_data.save_meta_data(meta_path)
     raw_data_path = 'statements/statement.csv'
-    raw_data = pd.read_csv(raw_data_path)
+    with metrics.stage('read_csv') as stage:
+        raw_data = pd.read_csv(raw_data_path)
+        stage.rows = len(raw_data)
     # model_data = ModelData(raw_data)
-    model_data = ModelData(data_path='data/data.csv', meta_path='meta_data.pkl')
+    with metrics.stage('load_data'):
+        model_data = ModelData(data_path=data_path, meta_path=args.meta)
 
     # create the model
-    model = Model(model_path='', input_size=len(model_data.word_list), hidden_size=128, output_size=len(model_data.class_names))
+    model = Model(model_path='', input_size=model_data.input_size, hidden_size=128, output_size=len(model_data.class_names))
 
+    # convert the labels to a tensor, X stays sparse and is made dense a mini-batch at a time
     X = model_data.X
-    # convert the data to tensors
-    X = torch.tensor(model_data.X.to_numpy(), dtype=torch.float)
     y = torch.tensor(model_data.y.to_numpy(), dtype=torch.float)
 
     # train the model
     model.train(X, y, epochs=1000)
 
     # save the model
-    model.save('model.pth')
+    model.save(args.model)
+    if args.bundle:
+        save_bundle(args.bundle, model, model_data)
+    if args.export_numpy:
+        model.export_numpy(args.export_numpy)
 
     # prompt the user for description
     description = input('Enter a description: ')
 
     while description != 'exit':
         # predict the class
-        inp = model_data.description_to_one_hot(description)
-        inp = torch.tensor(inp, dtype=torch.float).unsqueeze(0)
+        inp = model_data.transform([description]).to_dense()
         out = model.predict(inp).squeeze(0).argmax().item()
         # out = out.detach().numpy()
         # out = out.argmax()
@@ -48,4 +157,4 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,156 @@
+# timings and counters of each pipeline stage, for finding where a slow run spends its time
+# enabled with the BLC_METRICS environment variable (1, or a path to append JSON lines to)
+# or main.py --metrics; while disabled, stage() returns a shared no-op and count() returns
+# straight away, so the instrumentation costs next to nothing
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+
+from log import logger
+
+ENV_VAR = 'BLC_METRICS'
+
+
+def max_rss_mb() -> float | None:
+    """Return the peak resident memory of the process, or None where the resource module is missing."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return rss / 2 ** 20 if sys.platform == 'darwin' else rss / 2 ** 10
+
+
+class _NoStage:
+    """What stage() returns while metrics are disabled."""
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+class Stage:
+    """Times one run of a pipeline stage. Set rows inside the with block if it is only known there."""
+    __slots__ = ('metrics', 'name', 'rows', 'start')
+
+    def __init__(self, metrics: Metrics, name: str, rows: int | None):
+        self.metrics = metrics
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.add_stage(self.name, time.perf_counter() - self.start, self.rows)
+        return False
+
+
+class Metrics:
+    """Totals of the time and rows of each stage, named counters and per-item timings such as epochs."""
+
+    def __init__(self):
+        """Initialize the Metrics class."""
+        self.enabled = False
+        self.path = None
+        self.reset()
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        self.stages = {}
+        self.counters = {}
+        self.series = {}
+        self.values = {}
+
+    def enable(self, path: str = None):
+        """Start recording, appending emitted metrics to path if given."""
+        self.enabled = True
+        self.path = path
+
+    def disable(self):
+        """Stop recording."""
+        self.enabled = False
+
+    def stage(self, name: str, rows: int = None):
+        """Return a context manager timing one run of the stage name over rows rows."""
+        if not self.enabled:
+            return _NO_STAGE
+        return Stage(self, name, rows)
+
+    def add_stage(self, name: str, seconds: float, rows: int = None):
+        """Add one run of the stage name."""
+        stage = self.stages.setdefault(name, {'calls': 0, 'seconds': 0.0, 'rows': 0})
+        stage['calls'] += 1
+        stage['seconds'] += seconds
+        if rows is not None:
+            stage['rows'] += rows
+
+    def count(self, name: str, value: int = 1):
+        """Add value to the counter name."""
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        """Record one value of a series, such as the time of an epoch."""
+        if self.enabled:
+            self.series.setdefault(name, []).append(value)
+
+    def set(self, name: str, value):
+        """Record the latest value of name, such as the stats of a cache."""
+        if self.enabled:
+            self.values[name] = value
+
+    def snapshot(self) -> dict:
+        """Return everything recorded, with rows per second of each stage and summaries of each series."""
+        stages = {
+            name: dict(stage, rows_per_second=stage['rows'] / stage['seconds'] if stage['rows'] and stage['seconds'] else None)
+            for name, stage in self.stages.items()
+        }
+        series = {
+            name: {'count': len(values), 'total': sum(values), 'mean': sum(values) / len(values),
+                   'min': min(values), 'max': max(values)}
+            for name, values in self.series.items()
+        }
+        return {
+            'time': time.time(),
+            'stages': stages,
+            'counters': dict(self.counters),
+            'series': series,
+            'values': dict(self.values),
+            'peak_rss_mb': max_rss_mb(),
+        }
+
+    def emit(self) -> dict | None:
+        """Log the snapshot as JSON and append it to the metrics file, if enabled.
+
+        Returns: snapshot (dict), or None when disabled"""
+        if not self.enabled:
+            return None
+        snapshot = self.snapshot()
+        line = json.dumps(snapshot, default=str)
+        logger.info(f'metrics {line}')
+        if self.path:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+        return snapshot
+
+
+metrics = Metrics()
+
+_setting = os.environ.get(ENV_VAR, '')
+if _setting and _setting != '0':
+    metrics.enable(None if _setting == '1' else _setting)
@@ -0,0 +1,160 @@
+# find descriptions of the same merchant that differ only by store number, city or
+# reference, using MinHash signatures bucketed by locality-sensitive hashing so that
+# only descriptions sharing a bucket are ever compared
+from __future__ import annotations
+
+import random
+import zlib
+from collections import Counter
+
+from data import is_keyword, normalize_description, tokenize
+
+# a Mersenne prime larger than any crc32, small enough that a * hash + b fits in 64 bits
+PRIME = (1 << 31) - 1
+
+
+def shingles(description: str) -> frozenset[str]:
+    """Return the keywords of a description and their adjacent pairs, ignoring numbers like store or reference numbers.
+
+    The first one and two keywords are added again as prefixes, since the merchant name
+    usually comes first and the city or province last."""
+    words = [word.upper() for word in tokenize(description) if is_keyword(word) and not any(c.isdigit() for c in word)]
+    if not words:
+        return frozenset([normalize_description(description)])
+    pairs = [f'{first} {second}' for first, second in zip(words, words[1:])]
+    prefixes = ['^' + words[0]] + ['^' + pair for pair in pairs[:1]]
+    return frozenset(words + pairs + prefixes)
+
+
+class NearDuplicateIndex:
+    """An index clustering descriptions whose keyword sets have a Jaccard similarity of at least threshold.
+
+    Each description gets a MinHash signature of num_perm values, split into bands of
+    num_perm // bands rows. Descriptions sharing any band are candidates, and candidates
+    whose signatures agree on at least threshold of their values are clustered together.
+    """
+
+    def __init__(self, threshold: float = 0.4, num_perm: int = 128, bands: int = 64, seed: int = 1):
+        """Initialize the NearDuplicateIndex class."""
+        import numpy as np
+
+        assert num_perm % bands == 0
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        rng = random.Random(seed)
+        self.a = np.array([rng.randrange(1, PRIME) for _ in range(num_perm)], dtype=np.uint64)
+        self.b = np.array([rng.randrange(0, PRIME) for _ in range(num_perm)], dtype=np.uint64)
+
+        self.signatures = []
+        self.buckets = {}
+        # the first item indexed with each exact signature, so repeats skip the band lookups
+        self._representatives = {}
+        self._parents = []
+        self._signature_cache = {}
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def signature(self, description: str):
+        """Return the MinHash signature of a description."""
+        import numpy as np
+
+        words = shingles(description)
+        signature = self._signature_cache.get(words)
+        if signature is None:
+            hashes = np.array([zlib.crc32(word.encode()) for word in words], dtype=np.uint64) % PRIME
+            signature = ((self.a[:, None] * hashes[None, :] + self.b[:, None]) % PRIME).min(axis=1)
+            self._signature_cache[words] = signature
+        return signature
+
+    def similarity(self, first: int, second: int) -> float:
+        """Return the estimated Jaccard similarity of two indexed descriptions."""
+        return float((self.signatures[first] == self.signatures[second]).mean())
+
+    def _find(self, item: int) -> int:
+        while self._parents[item] != item:
+            self._parents[item] = self._parents[self._parents[item]]
+            item = self._parents[item]
+        return item
+
+    def add(self, description: str) -> int:
+        """Index a description, joining it to the cluster of any near duplicate already indexed.
+
+        Returns: item (int), the position of the description in the index"""
+        item = len(self.signatures)
+        signature = self.signature(description)
+        self.signatures.append(signature)
+        encoded = signature.tobytes()
+        representative = self._representatives.setdefault(encoded, item)
+        self._parents.append(self._find(representative) if representative != item else item)
+        if representative != item:
+            return item
+
+        width = len(encoded) // self.bands
+        for band in range(self.bands):
+            bucket = self.buckets.setdefault((band, encoded[band * width:(band + 1) * width]), [])
+            # comparing with the first member keeps each bucket linear in its size
+            if bucket and self._find(bucket[0]) != self._find(item) and self.similarity(bucket[0], item) >= self.threshold:
+                self._parents[self._find(item)] = self._find(bucket[0])
+            bucket.append(item)
+        return item
+
+    def update(self, descriptions):
+        """Index many descriptions."""
+        for description in descriptions:
+            self.add(description)
+
+    def cluster(self, item: int) -> int:
+        """Return the cluster id of an indexed description."""
+        return self._find(item)
+
+    def clusters(self) -> list[int]:
+        """Return the cluster id of every indexed description, in the order they were added."""
+        return [self._find(item) for item in range(len(self.signatures))]
+
+
+def cluster_descriptions(descriptions: list[str], **kwargs) -> list[int]:
+    """Return a cluster id for each description, equal for near duplicates."""
+    index = NearDuplicateIndex(**kwargs)
+    index.update(descriptions)
+    return index.clusters()
+
+
+def cluster_key(descriptions: list[str] = (), **kwargs):
+    """Return a function mapping a description to its cluster id, for use as a LabelingQueue key.
+
+    descriptions are indexed up front so their clusters are complete; any other description
+    is indexed when first seen and clustered with what has been indexed so far."""
+    index = NearDuplicateIndex(**kwargs)
+    items = {}
+    for description in descriptions:
+        if description not in items:
+            items[description] = index.add(description)
+
+    def key(description: str) -> int:
+        if description not in items:
+            items[description] = index.add(description)
+        return index.cluster(items[description])
+
+    return key
+
+
+def propagate_labels(descriptions: list[str], labels: list, **kwargs) -> list:
+    """Fill in missing labels with the most common label of their near-duplicate cluster.
+
+    Returns: labels (list), with unlabeled entries ('' or not a string) filled where possible"""
+    clusters = cluster_descriptions(descriptions, **kwargs)
+    votes = {}
+    for cluster, label in zip(clusters, labels):
+        if isinstance(label, str) and label:
+            votes.setdefault(cluster, Counter())[label] += 1
+
+    propagated = []
+    for cluster, label in zip(clusters, labels):
+        if not (isinstance(label, str) and label) and cluster in votes:
+            label = votes[cluster].most_common(1)[0][0]
+        propagated.append(label)
+    return propagated
@@ -0,0 +1,116 @@
+# run a trained Net with numpy alone, so classification-only deployments need neither
+# torch installed nor its import time and memory
+from __future__ import annotations
+
+import numpy as np
+
+# the parameters of Net, in the names torch gives them
+PARAMETERS = ('fc1.weight', 'fc1.bias', 'fc2.weight', 'fc2.bias')
+
+
+def softmax(z: np.ndarray) -> np.ndarray:
+    """Return the softmax of each row of z."""
+    z = z - z.max(axis=1, keepdims=True)
+    np.exp(z, out=z)
+    z /= z.sum(axis=1, keepdims=True)
+    return z
+
+
+def top_k(probabilities: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the k largest values of each row and their columns, largest first
+
+    Returns: confidences (numpy.ndarray), indices (numpy.ndarray), both of shape (len(probabilities), k)"""
+    k = min(k, probabilities.shape[1])
+    indices = np.argsort(-probabilities, axis=1, kind='stable')[:, :k]
+    return np.take_along_axis(probabilities, indices, axis=1), indices
+
+
+class NumpyNet:
+    """The forward pass of Net (linear, ReLU, linear, softmax) over numpy arrays.
+
+    Multi-hot input can be given as CSR rows; the first layer then sums the weight columns
+    of the active words instead of multiplying by a mostly zero row.
+    """
+
+    def __init__(self, arrays: dict):
+        """Initialize the NumpyNet class from the fc1/fc2 weights and biases."""
+        self.fc1_weight = np.asarray(arrays['fc1.weight'], dtype=np.float32)
+        self.fc1_bias = np.asarray(arrays['fc1.bias'], dtype=np.float32)
+        self.fc2_weight = np.asarray(arrays['fc2.weight'], dtype=np.float32)
+        self.fc2_bias = np.asarray(arrays['fc2.bias'], dtype=np.float32)
+        # rows of the transpose are the weights of one input column, gathered for sparse input
+        self._fc1_columns = None
+
+    @classmethod
+    def load(cls, path: str) -> 'NumpyNet':
+        """Load the weights written by Model.export_numpy."""
+        with np.load(path) as arrays:
+            return cls({name: arrays[name] for name in PARAMETERS})
+
+    @classmethod
+    def from_bundle(cls, bundle) -> 'NumpyNet':
+        """Use the weights of a ModelBundle, mapped from the bundle file."""
+        return cls(bundle.arrays())
+
+    @property
+    def input_size(self) -> int:
+        return self.fc1_weight.shape[1]
+
+    @property
+    def output_size(self) -> int:
+        return self.fc2_weight.shape[0]
+
+    def hidden(self, X: np.ndarray) -> np.ndarray:
+        """Return the first layer's output, before the ReLU, for dense rows X."""
+        return np.asarray(X, dtype=np.float32) @ self.fc1_weight.T + self.fc1_bias
+
+    def hidden_rows(self, crow_indices, col_indices) -> np.ndarray:
+        """Return the first layer's output, before the ReLU, for multi-hot rows in CSR layout."""
+        crow_indices = np.asarray(crow_indices, dtype=np.int64)
+        col_indices = np.asarray(col_indices, dtype=np.int64)
+        if self._fc1_columns is None:
+            self._fc1_columns = np.ascontiguousarray(self.fc1_weight.T)
+
+        rows = len(crow_indices) - 1
+        h = np.zeros((rows, self.fc1_weight.shape[0]), dtype=np.float32)
+        nonempty = np.diff(crow_indices) > 0
+        if col_indices.size:
+            # each segment between two row starts holds exactly the columns of one row
+            h[nonempty] = np.add.reduceat(self._fc1_columns[col_indices], crow_indices[:-1][nonempty], axis=0)
+        return h + self.fc1_bias
+
+    def output(self, h: np.ndarray) -> np.ndarray:
+        """Return the class probabilities given the first layer's output."""
+        np.maximum(h, 0, out=h)
+        return softmax(h @ self.fc2_weight.T + self.fc2_bias)
+
+    def forward(self, X: np.ndarray) -> np.ndarray:
+        """Return the class probabilities of dense rows X, or of one row."""
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            return self.output(self.hidden(X[None, :]))[0]
+        return self.output(self.hidden(X))
+
+    def forward_rows(self, crow_indices, col_indices) -> np.ndarray:
+        """Return the class probabilities of multi-hot rows in CSR layout."""
+        return self.output(self.hidden_rows(crow_indices, col_indices))
+
+    def predict_batch(self, X: np.ndarray, k: int = 1, batch_size: int = 1024) -> tuple[np.ndarray, np.ndarray]:
+        """Predict the top k classes for every dense row of X, batch_size rows at a time, like Model.predict_batch.
+
+        Returns: confidences (numpy.ndarray), indices (numpy.ndarray), both of shape (len(X), k)"""
+        k = min(k, self.output_size)
+        confidences = [np.empty((0, k), dtype=np.float32)]
+        indices = [np.empty((0, k), dtype=np.int64)]
+        for start in range(0, len(X), batch_size):
+            top = top_k(self.forward(X[start:start + batch_size]), k)
+            confidences.append(top[0])
+            indices.append(top[1])
+        return np.concatenate(confidences), np.concatenate(indices)
+
+    def predict_rows(self, crow_indices, col_indices, k: int = 1) -> tuple[np.ndarray, np.ndarray]:
+        """Predict the top k classes for every multi-hot row in CSR layout.
+
+        Returns: confidences (numpy.ndarray), indices (numpy.ndarray), both of shape (rows, k)"""
+        return top_k(self.forward_rows(crow_indices, col_indices), k)
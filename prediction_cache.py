@@ -0,0 +1,106 @@
+# an LRU cache of predictions for descriptions that have already been classified
+import os
+import pickle
+from collections import OrderedDict
+
+from data import normalize_description
+from log import logger
+
+# version of the file written by PredictionCache.save
+CACHE_FORMAT_VERSION = 1
+
+
+class PredictionCache:
+    """A size-bounded LRU cache of top k predictions keyed on the model version and normalized description.
+
+    The cache only holds predictions of one model version at a time; asking for another
+    version (e.g. after the model is retrained) drops every entry.
+    """
+
+    def __init__(self, maxsize: int = 100000, path: str = None):
+        """Initialize the PredictionCache class, loading path if it exists."""
+        self.maxsize = maxsize
+        self.path = path
+        self.model_version = None
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _check_version(self, model_version: str):
+        if model_version != self.model_version:
+            if self.entries:
+                logger.info(f'Model version changed from {self.model_version} to {model_version}, clearing prediction cache')
+            self.entries.clear()
+            self.model_version = model_version
+
+    def get(self, model_version: str, description: str, k: int = 1):
+        """Return the cached top k predictions for description, or None."""
+        self._check_version(model_version)
+        key = (normalize_description(description), k)
+        prediction = self.entries.get(key)
+        if prediction is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return prediction
+
+    def put(self, model_version: str, description: str, k: int, prediction: list[tuple[str, float]]):
+        """Cache the top k predictions for description, evicting the least recently used entries."""
+        self._check_version(model_version)
+        key = (normalize_description(description), k)
+        self.entries[key] = prediction
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict:
+        """Return the hit and miss counters."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+        }
+
+    def load(self, path: str):
+        """Load the entries saved at path."""
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        if data.get('format_version') != CACHE_FORMAT_VERSION:
+            logger.info('Prediction cache format changed, starting with an empty cache')
+            return
+        self.model_version = data['model_version']
+        self.entries = OrderedDict(data['entries'])
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        logger.info(f'Loaded {len(self.entries)} cached predictions')
+
+    def save(self, path: str = None):
+        """Save the entries to path, or to the path the cache was created with."""
+        path = path or self.path
+        if not path:
+            logger.info('No prediction cache path provided')
+            return
+        data = {
+            'format_version': CACHE_FORMAT_VERSION,
+            'model_version': self.model_version,
+            'entries': list(self.entries.items()),
+        }
+        with open(path, 'wb') as f:
+            pickle.dump(data, f)
+        logger.info(f'Saved {len(self.entries)} cached predictions')
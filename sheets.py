@@ -2,6 +2,9 @@ from __future__ import print_function
 
 import os.path
 import json
+import re
+import time
+import functools
 import google.auth
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
@@ -9,8 +12,15 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from sheets_cache import SheetsCache
+
 # If modifying these scopes, delete the file token.json.
-SCOPES = ['https://www.googleapis.com/auth/spreadsheets.readonly']
+# classifications and totals are written back, so read-only access is not enough
+# the Drive scope is only used to read the revision of a spreadsheet, to know if cached ranges are stale
+SCOPES = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive.metadata.readonly']
+
+# responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
 
 # The ID and range of a sample spreadsheet.
 SAMPLE_SPREADSHEET_ID = '18FIIl19SOQ6VL9j8hqJshijTY5Kx5yEx0y7MrcYBV5o'
@@ -27,22 +37,190 @@ def get_credentials():
         print("No credentials found")
         return None
 
-def get_values(spreadsheet_id, range_name, creds):
+def offset_range(range_name: str, rows: int) -> str:
+    """Return the top-left cell of range_name moved down by rows, such as 'Totals!A1' -> 'Totals!A11'."""
+    match = re.match(r"^(?:(?P<sheet>.*)!)?(?P<column>[A-Za-z]+)(?P<row>\d+)", range_name)
+    if not match:
+        raise ValueError(f"Cannot offset range {range_name}, expected it to start with a cell like A1")
+    sheet = f"{match['sheet']}!" if match['sheet'] is not None else ""
+    return f"{sheet}{match['column']}{int(match['row']) + rows}"
+
+
+def frame_values(frame) -> list[list]:
+    """Return the header and rows of a DataFrame as JSON-safe lists, with missing values left empty."""
+    rows = json.loads(frame.to_json(orient='values', date_format='iso'))
+    return [list(map(str, frame.columns))] + [["" if value is None else value for value in row] for row in rows]
+
+
+class SheetsClient:
+    """A Sheets API client that builds the service once and reuses its connection.
+
+    Reads fetch many ranges in one batchGet and writes send many ranges in as few
+    batchUpdate calls as max_cells allows. Rate limiting and transient server or network
+    errors are retried up to retries times, waiting backoff seconds and doubling each time.
+    http and api_endpoint point the client somewhere other than Google, such as a test server.
+
+    Given a SheetsCache, reads first ask Drive for the spreadsheet's version, one small
+    request, and only fetch the ranges not cached at that version. With revision_max_age,
+    a version checked less than that many seconds ago is trusted without asking again.
     """
-    Creates the batch_update the user has access to.
+
+    def __init__(self, creds=None, http=None, api_endpoint: str = None, retries: int = 5, backoff: float = 1.0,
+                 max_cells: int = 50000, cache: SheetsCache = None, revision_max_age: float = 0.0):
+        self.creds = creds
+        self.http = http
+        self.client_options = {'api_endpoint': api_endpoint} if api_endpoint else None
+        self.service = self.build('sheets', 'v4')
+        self._drive = None
+        self.retries = retries
+        self.backoff = backoff
+        self.max_cells = max_cells
+        self.cache = cache
+        self.revision_max_age = revision_max_age
+
+    def build(self, name: str, version: str):
+        """Build a service sharing this client's credentials, connection and endpoint."""
+        # pylint: disable=maybe-no-member
+        return build(name, version, credentials=None if self.http else self.creds, http=self.http,
+                     client_options=self.client_options, cache_discovery=False)
+
+    @property
+    def drive(self):
+        if self._drive is None:
+            self._drive = self.build('drive', 'v3')
+        return self._drive
+
+    def execute(self, request):
+        """Execute a request, retrying rate limiting and transient errors with exponential backoff."""
+        for attempt in range(self.retries + 1):
+            try:
+                return request.execute()
+            except HttpError as error:
+                if error.resp.status not in RETRY_STATUSES or attempt == self.retries:
+                    raise
+            except (ConnectionError, TimeoutError):
+                if attempt == self.retries:
+                    raise
+            time.sleep(self.backoff * 2 ** attempt)
+
+    def revision(self, spreadsheet_id: str) -> str:
+        """Return the current revision of a spreadsheet, its Drive version or else its modified time."""
+        if self.cache is not None:
+            revision = self.cache.revision(spreadsheet_id, self.revision_max_age)
+            if revision is not None:
+                return revision
+        metadata = self.execute(self.drive.files().get(
+            fileId=spreadsheet_id, fields='version,modifiedTime', supportsAllDrives=True))
+        revision = str(metadata.get('version') or metadata.get('modifiedTime'))
+        if self.cache is not None:
+            self.cache.set_revision(spreadsheet_id, revision)
+        return revision
+
+    def fetch(self, spreadsheet_id: str, ranges: list[str]) -> dict[str, list[list]]:
+        """
+        Read many ranges in one request, bypassing the cache
+
+        Returns: values (dict) of the rows of each requested range"""
+        if not ranges:
+            return {}
+        result = self.execute(self.service.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id, ranges=list(ranges)))
+        # value ranges come back in the order they were asked for, with normalized names
+        return {range_name: value_range.get('values', [])
+                for range_name, value_range in zip(ranges, result.get('valueRanges', []))}
+
+    def batch_get(self, spreadsheet_id: str, ranges: list[str]) -> dict[str, list[list]]:
+        """
+        Read many ranges, fetching only those not cached at the spreadsheet's current revision in one request
+
+        Returns: values (dict) of the rows of each requested range"""
+        if self.cache is None:
+            return self.fetch(spreadsheet_id, ranges)
+
+        checks = self.cache.revision_checks
+        revision = self.revision(spreadsheet_id)
+        values = {range_name: self.cache.get(spreadsheet_id, range_name, revision) for range_name in ranges}
+        missing = [range_name for range_name, rows in values.items() if rows is None]
+        if missing:
+            for range_name, rows in self.fetch(spreadsheet_id, missing).items():
+                self.cache.put(spreadsheet_id, range_name, revision, rows)
+                values[range_name] = rows
+        if self.cache.path and (missing or self.cache.revision_checks != checks):
+            self.cache.save()
+        return values
+
+    def get_values(self, spreadsheet_id: str, range_name: str) -> list[list]:
+        """Return the rows of one range."""
+        return self.batch_get(spreadsheet_id, [range_name])[range_name]
+
+    def chunks(self, data: dict[str, list[list]]) -> list[list[dict]]:
+        """
+        Split writes into batches of at most max_cells cells, splitting large ranges by rows
+
+        Returns: batches (list) of lists of {'range', 'values'}"""
+        batches = [[]]
+        cells = 0
+        for range_name, rows in data.items():
+            width = max((len(row) for row in rows), default=1) or 1
+            rows_per_part = max(self.max_cells // width, 1)
+            for start in range(0, max(len(rows), 1), rows_per_part):
+                part = rows[start:start + rows_per_part]
+                if cells and cells + len(part) * width > self.max_cells:
+                    batches.append([])
+                    cells = 0
+                batches[-1].append({'range': offset_range(range_name, start) if start else range_name, 'values': part})
+                cells += len(part) * width
+        return [batch for batch in batches if batch]
+
+    def batch_update(self, spreadsheet_id: str, data: dict[str, list[list]],
+                     value_input_option: str = 'USER_ENTERED') -> int:
+        """
+        Write rows to many ranges, in as few requests as max_cells allows
+
+        Returns: updated_cells (int)"""
+        updated_cells = 0
+        for batch in self.chunks(data):
+            result = self.execute(self.service.spreadsheets().values().batchUpdate(
+                spreadsheetId=spreadsheet_id, body={'valueInputOption': value_input_option, 'data': batch}))
+            updated_cells += result.get('totalUpdatedCells', 0)
+        if self.cache is not None:
+            # the write made a new revision, so cached ranges must not be trusted until it is checked again
+            self.cache.invalidate(spreadsheet_id)
+        return updated_cells
+
+    def write_classifications(self, spreadsheet_id: str, frame, classifications_range: str = 'Classified!A1',
+                              totals_range: str = 'Totals!A1', amount_column: str = 'Transaction Amount',
+                              class_column: str = 'Class') -> int:
+        """
+        Write classified transactions, such as from Classifier.classify_frame, and the total amount
+        of each class back to the spreadsheet in one batch update
+
+        Returns: updated_cells (int)"""
+        data = {classifications_range: frame_values(frame)}
+        if totals_range and amount_column in frame.columns:
+            totals = frame.groupby(class_column, sort=True)[amount_column].sum().reset_index()
+            data[totals_range] = frame_values(totals)
+        return self.batch_update(spreadsheet_id, data)
+
+
+@functools.lru_cache(maxsize=None)
+def get_client(creds, cache_path: str = None) -> SheetsClient:
+    """Return the client for creds, building the service on the first call only.
+    With cache_path, reads are cached there between runs."""
+    return SheetsClient(creds, cache=SheetsCache(cache_path) if cache_path else None)
+
+
+def get_values(spreadsheet_id, range_name, creds, cache_path: str = None):
+    """
+    Return the value range of range_name, or the HttpError if the request failed.
     Load pre-authorized user credentials from the environment.
     TODO(developer) - See https://developers.google.com/identity
     for guides on implementing OAuth2 for the application.
         """
-    # pylint: disable=maybe-no-member
     try:
-        service = build('sheets', 'v4', credentials=creds)
-
-        result = service.spreadsheets().values().get(
-            spreadsheetId=spreadsheet_id, range=range_name).execute()
-        rows = result.get('values', [])
+        rows = get_client(creds, cache_path).get_values(spreadsheet_id, range_name)
         print(f"{len(rows)} rows retrieved")
-        return result
+        return {'range': range_name, 'values': rows}
     except HttpError as error:
         print(f"An error occurred: {error}")
         return error
@@ -71,13 +249,8 @@ def main():
             token.write(creds.to_json())
 
     try:
-        service = build('sheets', 'v4', credentials=creds)
-
         # Call the Sheets API
-        sheet = service.spreadsheets()
-        result = sheet.values().get(spreadsheetId=SAMPLE_SPREADSHEET_ID,
-                                    range=SAMPLE_RANGE_NAME).execute()
-        values = result.get('values', [])
+        values = get_client(creds).get_values(SAMPLE_SPREADSHEET_ID, SAMPLE_RANGE_NAME)
 
         if not values:
             print('No data found.')
@@ -94,4 +267,5 @@ def main():
 if __name__ == '__main__':
     creds = get_credentials()
     if creds:
-        print(get_values(SAMPLE_SPREADSHEET_ID, 'October Groceries!B28:C29', creds))
\ No newline at end of file
+        print(get_values(SAMPLE_SPREADSHEET_ID, 'October Groceries!B28:C29', creds, cache_path='sheets_cache.pkl'))
+        print(get_client(creds, 'sheets_cache.pkl').cache.stats())
\ No newline at end of file
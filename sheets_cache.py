@@ -0,0 +1,114 @@
+# an on-disk cache of spreadsheet ranges, so unchanged sheets are not downloaded again
+import os
+import pickle
+import time
+
+from log import logger
+
+# version of the file written by SheetsCache.save
+CACHE_FORMAT_VERSION = 1
+
+
+class SheetsCache:
+    """A cache of the rows of spreadsheet ranges keyed on spreadsheet id and range.
+
+    Every entry remembers the revision of the spreadsheet it was read at (its Drive
+    version), and is only returned while the spreadsheet is still at that revision. The
+    last revision seen of each spreadsheet is kept with the time it was checked, so callers
+    can skip checking again for a while.
+    """
+
+    def __init__(self, path: str = None):
+        """Initialize the SheetsCache class, loading path if it exists."""
+        self.path = path
+        self.entries = {}
+        self.revisions = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.revision_checks = 0
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, spreadsheet_id: str, range_name: str, revision: str):
+        """Return the cached rows of range_name if they were read at revision, or None."""
+        entry = self.entries.get((spreadsheet_id, range_name))
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry[0] != revision:
+            self.stale += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def put(self, spreadsheet_id: str, range_name: str, revision: str, rows: list[list]):
+        """Cache the rows of range_name read at revision."""
+        self.entries[(spreadsheet_id, range_name)] = (revision, rows)
+
+    def revision(self, spreadsheet_id: str, max_age: float = 0.0):
+        """Return the last revision seen of spreadsheet_id if it was checked less than max_age seconds ago, or None."""
+        seen = self.revisions.get(spreadsheet_id)
+        if seen is None or time.time() - seen[1] >= max_age:
+            return None
+        return seen[0]
+
+    def set_revision(self, spreadsheet_id: str, revision: str):
+        """Remember the current revision of spreadsheet_id, dropping entries read at older revisions."""
+        self.revision_checks += 1
+        self.revisions[spreadsheet_id] = (revision, time.time())
+        self.entries = {key: entry for key, entry in self.entries.items()
+                        if key[0] != spreadsheet_id or entry[0] == revision}
+
+    def invalidate(self, spreadsheet_id: str = None):
+        """Drop the entries and revision of spreadsheet_id, or of every spreadsheet."""
+        if spreadsheet_id is None:
+            self.entries.clear()
+            self.revisions.clear()
+            return
+        self.entries = {key: entry for key, entry in self.entries.items() if key[0] != spreadsheet_id}
+        self.revisions.pop(spreadsheet_id, None)
+
+    def stats(self) -> dict:
+        """Return the hit, miss and revision check counters."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'revision_checks': self.revision_checks,
+            'size': len(self.entries),
+        }
+
+    def load(self, path: str):
+        """Load the entries saved at path."""
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+        if data.get('format_version') != CACHE_FORMAT_VERSION:
+            logger.info('Sheets cache format changed, starting with an empty cache')
+            return
+        self.entries = dict(data['entries'])
+        self.revisions = dict(data['revisions'])
+        logger.info(f'Loaded {len(self.entries)} cached ranges')
+
+    def save(self, path: str = None):
+        """Save the entries to path, or to the path the cache was created with."""
+        path = path or self.path
+        if not path:
+            logger.info('No sheets cache path provided')
+            return
+        data = {
+            'format_version': CACHE_FORMAT_VERSION,
+            'entries': list(self.entries.items()),
+            'revisions': list(self.revisions.items()),
+        }
+        # write next to the old file and swap, so an interrupted save keeps the old cache
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(data, f)
+        os.replace(path + '.tmp', path)
@@ -0,0 +1,29 @@
+import json
+
+from benchmark import MERCHANTS, generate_statement, main, run, warm_up
+
+
+def test_generate_statement_is_deterministic():
+    statement = generate_statement(200, seed=1)
+    assert list(statement.columns) == ['Description', 'Transaction Amount', 'Class']
+    assert len(statement) == 200
+    assert statement.equals(generate_statement(200, seed=1))
+    assert set(statement['Class']) <= set(MERCHANTS)
+    assert (statement['Transaction Amount'] > 0).all()
+
+def test_run_measures_every_stage(tmp_path):
+    warm_up()
+    results = run(100, train_rows=50, epochs=1, one_hot_max_rows=100, trace_memory=False, directory=str(tmp_path))
+    assert [result.stage for result in results] == [
+        'generate_statement', 'create_word_list', 'preprocess_data', 'data_to_one_hot', 'train', 'predict',
+        'save_data', 'load_data']
+    assert all(result.seconds > 0 and result.peak_traced_mb is None for result in results)
+    assert results[4].rows == 50
+
+def test_main_writes_json(tmp_path):
+    output = tmp_path / 'benchmark.json'
+    main(['--rows', '100', '--train-rows', '50', '--epochs', '1', '--one-hot-max-rows', '0', '--output', str(output)])
+    report = json.loads(output.read_text())
+    assert report['environment']['python']
+    assert {result['stage'] for result in report['results']} >= {'train', 'predict'}
+    assert all(result['peak_traced_mb'] > 0 for result in report['results'])
@@ -0,0 +1,45 @@
+import pytest
+import torch
+
+from bundle import ModelBundle, save_bundle
+from classifier import Classifier
+
+
+@pytest.fixture
+def bundle_path(model, model_data, tmp_path) -> str:
+    path = str(tmp_path / 'model.blcb')
+    save_bundle(path, model, model_data)
+    return path
+
+
+def test_load_reads_header(bundle_path, model_data):
+    bundle = ModelBundle.load(bundle_path)
+    assert bundle.word_list == model_data.word_list
+    assert bundle.class_names == model_data.class_names
+    assert bundle.header['hidden_size'] == 8
+    assert bundle._arrays is None
+
+def test_model_matches_saved_model(bundle_path, model):
+    loaded = ModelBundle.load(bundle_path).model()
+    X = torch.eye(5)
+    assert torch.equal(loaded.predict(X), model.predict(X))
+
+def test_model_version_changes_with_weights(bundle_path, model, model_data, tmp_path):
+    version = ModelBundle.load(bundle_path).model_version
+    assert save_bundle(str(tmp_path / 'same.blcb'), model, model_data) == version
+    with torch.no_grad():
+        model.model.fc2.bias += 1
+    assert save_bundle(str(tmp_path / 'retrained.blcb'), model, model_data) != version
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / 'model.pth'
+    path.write_bytes(b'not a bundle at all')
+    with pytest.raises(ValueError):
+        ModelBundle.load(str(path))
+
+def test_classifier_from_bundle_loads_weights_lazily(bundle_path, model, model_data):
+    classifier = Classifier.from_bundle(bundle_path)
+    assert classifier._model is None
+    expected = Classifier(model_data, model).classify_many(['TIM HORTONS', 'SHELL GAS'], k=2)
+    assert classifier.classify_many(['TIM HORTONS', 'SHELL GAS'], k=2) == expected
+    assert classifier._model is not None
@@ -0,0 +1,137 @@
+import pytest
+import pandas as pd
+import torch
+
+from classifier import Classifier
+from data import ModelData
+from hashing_featurizer import HashingFeaturizer
+from model import TrainingReport
+
+
+@pytest.fixture
+def classifier(model_data, model) -> Classifier:
+    return Classifier(model_data, model, batch_size=2)
+
+@pytest.fixture
+def descriptions() -> list[str]:
+    return ['TIM HORTONS #1234', 'SHELL GAS STATION', 'NETFLIX.COM', 'TIM HORTONS #0987', 'GAS BAR']
+
+
+def test_predict_batch_matches_predict(model, model_data, descriptions):
+    X = model_data.transform(descriptions).to_dense()
+    confidences, indices = model.predict_batch(X, k=1, batch_size=2)
+    expected = model.predict(X).detach()
+    assert indices.squeeze(1).tolist() == expected.argmax(dim=1).tolist()
+    assert torch.allclose(confidences.squeeze(1), expected.max(dim=1).values)
+
+def test_predict_batch_empty(model):
+    confidences, indices = model.predict_batch(torch.empty(0, model.input_size), k=2)
+    assert confidences.shape == (0, 2)
+    assert indices.shape == (0, 2)
+
+def test_classify_many_returns_top_k(classifier, descriptions):
+    results = classifier.classify_many(descriptions, k=2)
+    assert len(results) == len(descriptions)
+    for result in results:
+        assert len(result) == 2
+        assert result[0][1] >= result[1][1]
+        assert {name for name, _ in result} <= {'Coffee', 'Gas', 'Subscriptions'}
+
+def test_classify_many_matches_classify(classifier, descriptions):
+    assert classifier.classify_many(descriptions) == [classifier.classify(description) for description in descriptions]
+
+def test_classify_frame(classifier, descriptions):
+    df = pd.DataFrame({'Description': descriptions, 'Transaction Amount': range(len(descriptions))})
+    classified = classifier.classify_frame(df, k=5)
+    assert list(classified.columns) == [
+        'Description', 'Transaction Amount',
+        'Class', 'Confidence', 'Class 2', 'Confidence 2', 'Class 3', 'Confidence 3',
+    ]
+    assert classified['Class'].tolist() == [result[0][0] for result in classifier.classify_many(descriptions)]
+
+def test_classify_csv_streams_in_chunks(classifier, descriptions, tmp_path):
+    df = pd.DataFrame({'Description': descriptions, 'Transaction Amount': range(len(descriptions))})
+    df.to_csv(tmp_path / 'statement.csv', index=False)
+    rows = classifier.classify_csv(tmp_path / 'statement.csv', tmp_path / 'classified.csv', k=2, chunksize=2)
+    assert rows == len(descriptions)
+    classified = pd.read_csv(tmp_path / 'classified.csv')
+    expected = classifier.classify_frame(df, k=2)
+    assert classified['Class'].tolist() == expected['Class'].tolist()
+    assert classified['Class 2'].tolist() == expected['Class 2'].tolist()
+
+def test_classify_many_answers_labeled_descriptions_exactly(classifier, descriptions):
+    classifier.model_data.label_index.add('tim hortons #1234', 'Subscriptions')
+    results = classifier.classify_many(descriptions, k=2)
+    assert results[0] == [('Subscriptions', 1.0), ('Coffee', 0.0)]
+    assert results[1:] == classifier.predict(descriptions[1:], k=2)
+
+def test_update_grows_vocabulary_and_classes(classifier, model_data, tmp_path):
+    raw_data = pd.DataFrame({
+        'Description': ['SPOTIFY PREMIUM A B', 'SPOTIFY PREMIUM C D', 'TIM HORTONS E F', 'TIM HORTONS G H'],
+        'Class': ['Music', 'Music', 'Coffee', 'Coffee'],
+    })
+    report = classifier.update(raw_data, epochs=3, seed=0)
+    assert report.epochs <= 3
+    assert model_data.word_list[-2:] == ['SPOTIFY', 'PREMIUM']
+    assert model_data.class_names[-1] == 'Music'
+    assert classifier.model.input_size == 7
+    assert classifier.model.output_size == 4
+    assert classifier.classify('spotify premium a b') == [('Music', 1.0)]
+    assert len(classifier.predict(['SPOTIFY PREMIUM'], k=4)[0]) == 4
+
+def test_update_skips_unlabeled_rows(classifier, model_data):
+    raw_data = pd.DataFrame({
+        'Description': ['TIM HORTONS A', 'SHELL GAS B', 'TIM HORTONS C', 'SHELL GAS D'],
+        'Class': ['Coffee', None, '', 'Gas'],
+    })
+    report = classifier.update(raw_data, epochs=1, seed=0)
+    assert report.epochs == 1
+    assert 'SHELL GAS B' not in model_data.label_index
+    assert 'TIM HORTONS C' not in model_data.label_index
+    with pytest.raises(ValueError):
+        classifier.update(raw_data[raw_data['Class'].isna()])
+
+def test_update_replays_history(classifier, model_data):
+    # the training set the model was trained on, featurized with the same vocabulary and classes
+    history = ModelData()
+    history.word_list = list(model_data.word_list)
+    history.class_names = list(model_data.class_names)
+    history.raw_data = pd.DataFrame({
+        'Description': ['SHELL GAS STATION A', 'SHELL GAS STATION B', 'TIM HORTONS C', 'TIM HORTONS D'],
+        'Class': ['Gas', 'Gas', 'Coffee', 'Coffee'],
+    })
+    assert history.preprocess_data()
+    X, labels = history.sample(3, input_size=7, seed=0)
+    assert X.shape == (3, 7)
+    assert set(labels.tolist()) <= {0, 1}
+
+    before = classifier.predict(['NETFLIX.COM Z'], k=3)[0]
+    raw_data = pd.DataFrame({'Description': ['NETFLIX.COM X', 'NETFLIX.COM Y'], 'Class': ['Streaming', 'Streaming']})
+    report = classifier.update(raw_data, history=history, replay_size=2, epochs=100, learning_rate=1e-2, seed=0)
+    assert isinstance(report, TrainingReport)
+    assert 1 <= report.epochs <= 100
+    assert model_data.class_names == ['Coffee', 'Gas', 'Subscriptions', 'Streaming']
+    assert classifier.model.output_size == 4
+    after = classifier.predict(['NETFLIX.COM Z'], k=4)[0]
+    assert 'Streaming' not in [name for name, _ in before]
+    assert after[0][0] == 'Streaming'
+
+def test_update_rejects_mismatched_history(classifier, model_data):
+    history = ModelData()
+    history.word_list = ['SHELL', 'TIM']
+    history.class_names = list(model_data.class_names)
+    raw_data = pd.DataFrame({'Description': ['TIM HORTONS A'], 'Class': ['Coffee']})
+    with pytest.raises(ValueError, match='words'):
+        classifier.update(raw_data, history=history)
+
+    history.word_list = model_data.word_list[:3]
+    history.class_names = ['Gas', 'Coffee']
+    with pytest.raises(ValueError, match='classes'):
+        classifier.update(raw_data, history=history)
+
+    history.class_names = ['Coffee']
+    history.featurizer = HashingFeaturizer(n_features=64)
+    with pytest.raises(ValueError, match='featurized'):
+        classifier.update(raw_data, history=history)
+    # nothing was changed by the rejected updates
+    assert classifier.model.input_size == len(model_data.word_list)
@@ -0,0 +1,68 @@
+import pytest
+
+from completion import CompletionIndex
+
+
+@pytest.fixture
+def root():
+    tkinter = pytest.importorskip('tkinter')
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError:
+        pytest.skip('no display')
+    root.withdraw()
+    yield root
+    root.destroy()
+
+
+def test_complete_ignores_case():
+    index = CompletionIndex(['Groceries', 'gas', 'Gifts', 'Rent'])
+    assert index.complete('g') == ['gas', 'Gifts', 'Groceries']
+    assert index.complete('GR') == ['Groceries']
+    assert index.complete('x') == []
+    assert index.complete('') == ['gas', 'Gifts', 'Groceries', 'Rent']
+
+def test_complete_limit():
+    index = CompletionIndex(['Gas', 'Gifts', 'Groceries'])
+    assert index.complete('g', limit=2) == ['Gas', 'Gifts']
+
+def test_add_is_incremental():
+    index = CompletionIndex()
+    assert index.add('Coffee')
+    assert not index.add('Coffee')
+    assert index.add('coffee')
+    assert len(index) == 2
+    assert 'Coffee' in index
+    assert index.complete('cof') == ['Coffee', 'coffee']
+
+def test_completer_follows_readline_protocol():
+    index = CompletionIndex(['Gas', 'Gifts', 'Rent'])
+    complete = index.completer()
+    assert [complete('g', state) for state in range(3)] == ['Gas', 'Gifts', None]
+    index.add('Groceries')
+    assert complete('gr', 0) == 'Groceries'
+
+def test_autocomplete_entry_selection(root):
+    from description_labeler import AutocompleteEntry
+
+    entry = AutocompleteEntry(['Gas', 'Gifts', 'Groceries', 'Rent'], root)
+    entry.set('g')
+    # as if the debounced update had fired
+    entry.after_cancel(entry._pending)
+    entry.refresh()
+    assert entry._pending is None
+    assert entry.complete_list == ['Gas', 'Gifts', 'Groceries']
+    assert entry.listbox_visible
+
+    entry.listbox.activate(1)
+    entry.selection(None)
+    assert entry.get() == 'Gifts'
+    assert entry._pending is None
+    assert not entry.listbox_visible
+
+    # picking again with nothing pending
+    entry.listbox_update()
+    entry._pending = None
+    entry.selection(None)
+    assert not entry.listbox_visible
+    entry.destroy()
@@ -0,0 +1,58 @@
+import pytest
+import pandas as pd
+import torch
+
+from bundle import ModelBundle, save_bundle
+from data import ModelData
+from hashing_featurizer import HashingFeaturizer, featurizer_from_settings
+from model import Model
+
+
+@pytest.fixture
+def featurizer() -> HashingFeaturizer:
+    return HashingFeaturizer(n_features=64, ngram_range=(3, 3))
+
+
+def test_tokens(featurizer):
+    assert featurizer.tokens('Tim #1234') == ['w:TIM', 'c:<TI', 'c:TIM', 'c:IM>']
+
+def test_transform_shape_is_fixed(featurizer):
+    X = featurizer.transform(['TIM HORTONS #1234', 'A NEW MERCHANT NOBODY HAS SEEN'])
+    assert X.shape == (2, 64)
+
+def test_transform_is_deterministic(featurizer):
+    X = featurizer.transform(['TIM HORTONS']).to_dense()
+    assert torch.equal(X, HashingFeaturizer(n_features=64, ngram_range=(3, 3)).transform(['tim  hortons']).to_dense())
+
+def test_similar_merchants_share_columns(featurizer):
+    X = featurizer.transform(['TIM HORTONS #1234', 'TIMS HORTON #0987']).to_dense()
+    assert (X[0] * X[1]).sum() > 0
+
+def test_settings_round_trip(featurizer):
+    rebuilt = featurizer_from_settings(featurizer.settings())
+    assert rebuilt.settings() == featurizer.settings()
+    assert featurizer_from_settings(None) is None
+
+def test_model_data_with_hashing_featurizer(featurizer, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    raw_data = pd.DataFrame({
+        'Description': ['TIM HORTONS #1234 TORONTO ON', 'SHELL GAS HALIFAX NS'],
+        'Class': ['Coffee', 'Gas'],
+    })
+    model_data = ModelData(raw_data, featurizer=featurizer)
+    assert model_data.word_list == []
+    assert model_data.input_size == 64
+    assert model_data.X.shape == (2, 64)
+
+    loaded = ModelData(data_path='data.bin', meta_path='meta_data.pkl')
+    assert loaded.featurizer.settings() == featurizer.settings()
+    assert torch.equal(loaded.X.to_dense(), model_data.X.to_dense())
+
+def test_bundle_keeps_featurizer(featurizer, tmp_path):
+    model_data = ModelData(featurizer=featurizer)
+    model_data.word_list = []
+    model_data.class_names = ['Coffee', 'Gas']
+    model = Model(model_path='', input_size=model_data.input_size, hidden_size=8, output_size=2)
+    save_bundle(str(tmp_path / 'model.blcb'), model, model_data)
+    loaded = ModelBundle.load(str(tmp_path / 'model.blcb')).model_data()
+    assert loaded.featurizer.settings() == featurizer.settings()
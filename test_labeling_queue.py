@@ -0,0 +1,52 @@
+import math
+
+import pytest
+
+from classifier import Classifier
+from labeling_queue import LabelingQueue, uncertainty
+
+
+@pytest.fixture
+def descriptions() -> list[str]:
+    return ['TIM HORTONS', 'SHELL GAS', 'tim  hortons', 'NETFLIX.COM', 'SHELL GAS']
+
+@pytest.fixture
+def classifier(model_data, trained_model) -> Classifier:
+    return Classifier(model_data, trained_model)
+
+
+def test_uncertainty():
+    assert uncertainty([0.5, 0.5]) == pytest.approx(math.log(2))
+    assert uncertainty([1.0, 0.0]) == 0
+    assert uncertainty([0.7, 0.2, 0.1], 'margin') == pytest.approx(0.5)
+    with pytest.raises(ValueError):
+        uncertainty([1.0], 'random')
+
+def test_groups_identical_descriptions(descriptions):
+    queue = LabelingQueue(descriptions)
+    assert len(queue) == 3
+    assert queue.current_description() == 'TIM HORTONS'
+    assert queue.label('Coffee') == [0, 2]
+    assert queue.label('Gas') == [1, 4]
+    assert queue.labels == ['Coffee', 'Gas', 'Coffee', '', 'Gas']
+    assert len(queue) == 1
+
+def test_empty_queue():
+    queue = LabelingQueue([])
+    assert queue.current() is None
+    assert queue.current_description() == ''
+
+@pytest.mark.parametrize('strategy', ['entropy', 'margin'])
+def test_orders_by_uncertainty(descriptions, classifier, strategy):
+    # NETFLIX.COM has no known words, so the model is least sure about it
+    queue = LabelingQueue(descriptions, classifier, strategy)
+    assert queue.current_description() == 'NETFLIX.COM'
+    assert sorted(map(tuple, queue.groups)) == [(0, 2), (1, 4), (3,)]
+
+def test_extend_joins_existing_groups(descriptions):
+    queue = LabelingQueue(descriptions)
+    queue.label('Coffee')
+    queue.extend(['Tim Hortons', 'UBER TRIP', 'shell gas'])
+    assert queue.labels[5:] == ['Coffee', '', '']
+    assert queue.groups[1] == [1, 4, 7]
+    assert queue.upcoming(5) == ['SHELL GAS', 'NETFLIX.COM', 'UBER TRIP']
@@ -0,0 +1,52 @@
+import os
+import threading
+
+import pytest
+
+import log
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    path = str(tmp_path / 'logs' / 'log.txt')
+    yield path
+    log.configure()
+
+
+def test_nothing_is_opened_or_started_before_the_first_record(log_path):
+    handler = log.configure(log_path, console=False)
+    assert handler.listener is None
+    assert not os.path.exists(os.path.dirname(log_path))
+
+def test_records_are_written_by_a_background_thread(log_path):
+    handler = log.configure(log_path, console=False)
+    threads = []
+    target = handler.targets[0]
+    original = target.emit
+    target.emit = lambda record: (threads.append(threading.get_ident()), original(record))
+
+    log.get_logger('model').info('epoch 1')
+    log.flush()
+    assert threads and threads[0] != threading.get_ident()
+    with open(log_path) as f:
+        lines = f.read().splitlines()
+    # one line per record: module loggers share the main logger's handler
+    assert len(lines) == 1
+    assert lines[0].endswith('log.model - INFO - epoch 1')
+
+def test_log_file_rotates(log_path):
+    log.configure(log_path, max_bytes=1000, backup_count=2, console=False)
+    for i in range(100):
+        log.logger.info(f'record {i}')
+    log.flush()
+    assert sorted(os.listdir(os.path.dirname(log_path))) == ['log.txt', 'log.txt.1', 'log.txt.2']
+    assert os.path.getsize(log_path) <= 1000
+
+def test_logging_restarts_after_flush(log_path):
+    log.configure(log_path, console=False)
+    log.logger.info('first')
+    log.flush()
+    log.logger.info('second')
+    log.flush()
+    with open(log_path) as f:
+        assert [line.rsplit(' - ', 1)[1] for line in f.read().splitlines()] == ['first', 'second']
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+import torch
+
+from metrics import Metrics, metrics
+from model import Model
+
+
+@pytest.fixture
+def enabled(tmp_path):
+    path = tmp_path / 'metrics.jsonl'
+    metrics.reset()
+    metrics.enable(str(path))
+    yield path
+    metrics.disable()
+    metrics.reset()
+
+
+def test_disabled_records_nothing():
+    recorder = Metrics()
+    with recorder.stage('read_csv', 10) as stage:
+        stage.rows = 20
+    recorder.count('classified', 5)
+    recorder.observe('epoch_seconds', 0.1)
+    assert recorder.snapshot()['stages'] == {} and recorder.counters == {} and recorder.series == {}
+    assert recorder.emit() is None
+
+def test_stages_counters_and_series():
+    recorder = Metrics()
+    recorder.enable()
+    for rows in (10, 30):
+        with recorder.stage('read_csv') as stage:
+            stage.rows = rows
+    recorder.count('classified', 5)
+    recorder.observe('epoch_seconds', 1.0)
+    recorder.observe('epoch_seconds', 3.0)
+    snapshot = recorder.snapshot()
+    assert snapshot['stages']['read_csv']['calls'] == 2
+    assert snapshot['stages']['read_csv']['rows'] == 40
+    assert snapshot['stages']['read_csv']['rows_per_second'] > 0
+    assert snapshot['counters'] == {'classified': 5}
+    assert snapshot['series']['epoch_seconds'] == {'count': 2, 'total': 4.0, 'mean': 2.0, 'min': 1.0, 'max': 3.0}
+
+def test_training_and_prediction_are_recorded(enabled):
+    model = Model(model_path='', input_size=4, hidden_size=4, output_size=2)
+    model.train(torch.zeros(10, 4), torch.zeros(10, 2), epochs=3, patience=3, validation_split=0.0)
+    model.predict_batch(torch.zeros(7, 4))
+    snapshot = metrics.emit()
+    assert snapshot['series']['epoch_seconds']['count'] == 3
+    assert snapshot['stages']['train']['rows'] == 30
+    assert snapshot['stages']['predict']['rows'] == 7
+    assert json.loads(enabled.read_text())['stages'].keys() == snapshot['stages'].keys()
@@ -0,0 +1,114 @@
+import pytest
+import torch
+
+from model import Model, QuantizationReport, RowDataset, TrainingReport
+
+
+@pytest.fixture
+def data() -> tuple[torch.Tensor, torch.Tensor]:
+    # two separable classes, each keyed on its own word
+    X = torch.tensor([[1, 0, 1], [1, 0, 0], [0, 1, 1], [0, 1, 0]] * 10, dtype=torch.float)
+    y = torch.tensor([[1, 0], [1, 0], [0, 1], [0, 1]] * 10, dtype=torch.float)
+    return X, y
+
+@pytest.fixture
+def model() -> Model:
+    torch.manual_seed(0)
+    return Model(model_path='', input_size=3, hidden_size=8, output_size=2)
+
+
+def test_train_returns_report(model, data):
+    report = model.train(*data, epochs=5, seed=0)
+    assert isinstance(report, TrainingReport)
+    assert report.epochs == 5
+    assert not report.stopped_early
+    assert report.seconds >= 0
+
+def test_train_learns(model, data):
+    X, y = data
+    model.train(X, y, epochs=200, batch_size=8, learning_rate=1e-2, seed=0)
+    assert model.predict(X).argmax(dim=1).tolist() == y.argmax(dim=1).tolist()
+
+def test_train_stops_early(model, data):
+    # the loss cannot improve without updates, so training stops after patience epochs
+    report = model.train(*data, epochs=100, learning_rate=0.0, patience=3, seed=0)
+    assert report.stopped_early
+    assert report.epochs == 4
+
+@pytest.mark.parametrize('options', [{'epochs': 0}, {'validation_split': 1.0}])
+def test_train_rejects_nothing_to_train(model, data, options):
+    with pytest.raises(ValueError):
+        model.train(*data, **options)
+
+def test_train_is_reproducible_with_seed(data):
+    reports = []
+    for _ in range(2):
+        torch.manual_seed(0)
+        model = Model(model_path='', input_size=3, hidden_size=8, output_size=2)
+        reports.append(model.train(*data, epochs=5, seed=1))
+    assert reports[0].validation_loss == reports[1].validation_loss
+
+def test_train_on_sparse_rows_matches_dense(data):
+    X, y = data
+    states = []
+    for rows in (X, X.to_sparse_csr()):
+        torch.manual_seed(0)
+        model = Model(model_path='', input_size=3, hidden_size=8, output_size=2)
+        model.train(rows, y, epochs=5, seed=1)
+        states.append(model.model.state_dict())
+    for name, tensor in states[0].items():
+        assert torch.allclose(states[1][name], tensor)
+
+def test_row_dataset_densifies_one_batch():
+    X = torch.tensor([[0, 2, 0], [0, 0, 0], [1, 0, 3]], dtype=torch.float)
+    dataset = RowDataset(X.to_sparse_csr(), torch.arange(3))
+    X_batch, y_batch = dataset.collate([2, 1, 0])
+    assert torch.equal(X_batch, X[[2, 1, 0]])
+    assert y_batch.tolist() == [2, 1, 0]
+
+def test_expand_keeps_predictions(model, data):
+    X, _ = data
+    before = model.predict(X).detach()
+    model.expand(5, 2)
+    assert model.input_size == 5
+    X_wide = torch.cat([X, torch.ones(len(X), 2)], dim=1)
+    assert torch.allclose(model.predict(X_wide), before)
+
+def test_expand_adds_classes(model, data):
+    X, _ = data
+    version = model.version
+    model.expand(3, 4)
+    assert model.predict(X).shape == (len(X), 4)
+    assert model.version != version
+
+@pytest.mark.parametrize('dtype', ['int8', 'float16'])
+def test_quantize_keeps_predictions(model, data, dtype):
+    X, y = data
+    model.train(X, y, epochs=200, patience=200, validation_split=0.0, seed=0)
+    quantized = model.quantize(dtype)
+    report = model.compare_quantized(quantized, X, y.argmax(dim=1))
+    assert isinstance(report, QuantizationReport)
+    assert report.dtype == dtype and report.rows == len(X)
+    assert report.agreement == 1.0
+    assert report.accuracy_delta == 0.0
+    assert report.max_confidence_delta < 0.05
+    # the float model is left as it was
+    assert model.quantization is None
+    assert quantized.version != model.version
+
+def test_quantize_shrinks_weights():
+    model = Model(model_path='', input_size=2000, hidden_size=128, output_size=4)
+    float_bytes = model.size_bytes()
+    half = model.quantize('float16')
+    assert half.size_bytes() < float_bytes * 0.6
+    # stored as halves, computed in float32
+    assert half.model.fc1.weight.dtype == torch.float16
+    assert half.predict(torch.zeros(1, 2000)).dtype == torch.float32
+    assert model.quantize('int8').size_bytes() < float_bytes * 0.35
+
+def test_quantized_model_cannot_train(model, data):
+    quantized = model.quantize('int8')
+    with pytest.raises(AssertionError):
+        quantized.train(*data, epochs=1)
+    with pytest.raises(ValueError):
+        model.quantize('int4')
@@ -0,0 +1,119 @@
+import os
+import json
+import pytest
+import pandas as pd
+
+from data import LabelIndex, ModelData, split_shards
+
+
+@pytest.fixture
+def raw_data() -> pd.DataFrame:
+    return pd.DataFrame({
+        'Description': [
+            'TIM HORTONS #1234 TORONTO ON',
+            'TIM HORTONS #0987 OTTAWA ON',
+            'SHELL/GAS STATION HALIFAX NS',
+            'SHELL-GAS STATION TORONTO ON',
+            'NETFLIX.COM SUBSCRIPTION LOS GATOS',
+        ],
+        'Transaction Amount': [2.5, 3.1, 40.0, 52.3, 16.99],
+        'Class': ['Coffee', 'Coffee', 'Gas', 'Gas', 'Subscriptions'],
+    })
+
+
+@pytest.fixture
+def model_data(raw_data, tmp_path, monkeypatch) -> ModelData:
+    monkeypatch.chdir(tmp_path)
+    return ModelData(raw_data)
+
+
+def test_word_list(model_data):
+    assert model_data.word_list == ['TIM', 'HORTONS', 'SHELL', 'GAS', 'STATION']
+
+def test_word_index_matches_word_list(model_data):
+    assert [model_data.word_index[word] for word in model_data.word_list] == list(range(len(model_data.word_list)))
+
+def test_transform_shape(model_data, raw_data):
+    X = model_data.transform(raw_data['Description'])
+    assert X.shape == (len(raw_data), len(model_data.word_list))
+
+def test_transform_matches_description_to_one_hot(model_data, raw_data):
+    X = model_data.transform(raw_data['Description']).to_dense()
+    expected = [model_data.description_to_one_hot(description) for description in raw_data['Description']]
+    assert X.tolist() == expected
+
+def test_transform_ignores_case_and_repeats(model_data):
+    X = model_data.transform(['tim hortons tim']).to_dense()
+    assert X.tolist() == [[1, 1, 0, 0, 0]]
+
+def test_transform_empty(model_data):
+    assert model_data.transform([]).shape == (0, len(model_data.word_list))
+
+def test_preprocess_data(model_data):
+    assert model_data.X.to_dense().tolist() == [
+        [1, 1, 0, 0, 0],
+        [1, 1, 0, 0, 0],
+        [0, 0, 1, 1, 1],
+        [0, 0, 1, 1, 1],
+        [0, 0, 0, 0, 0],
+    ]
+    assert model_data.y.to_numpy().tolist() == [[1, 0, 0], [1, 0, 0], [0, 1, 0], [0, 1, 0], [0, 0, 1]]
+
+def test_split_shards(monkeypatch):
+    monkeypatch.setattr('data.MIN_ROWS_PER_PROCESS', 2)
+    assert split_shards(list(range(7)), 3) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert split_shards(list(range(3)), 4) == [[0, 1, 2]]
+    assert split_shards([], 4) == [[]]
+
+def test_parallel_matches_serial(raw_data, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr('data.MIN_ROWS_PER_PROCESS', 1)
+    raw_data = pd.concat([raw_data] * 3, ignore_index=True)
+    serial = ModelData(raw_data)
+    parallel = ModelData(raw_data, processes=4)
+    assert parallel.word_list == serial.word_list
+    assert parallel.X.to_dense().tolist() == serial.X.to_dense().tolist()
+
+@pytest.mark.parametrize('data_path', ['data.bin', 'data.csv'])
+def test_save_and_load_data(model_data, data_path):
+    model_data.save_data(data_path)
+    loaded = ModelData(data_path=data_path, meta_path='meta_data.pkl')
+    assert loaded.X.shape == model_data.X.shape
+    assert loaded.X.to_dense().tolist() == model_data.X.to_dense().tolist()
+    assert loaded.y.to_numpy().tolist() == model_data.y.to_numpy().tolist()
+    assert loaded.word_list == model_data.word_list
+    assert loaded.class_names == model_data.class_names
+
+def test_save_data_binary_header(model_data):
+    model_data.save_data('data.bin')
+    with open('data.bin.json') as f:
+        header = json.load(f)
+    assert header['shape'] == [5, 5]
+    assert header['classes'] == 3
+    assert os.path.getsize('data.bin') == sum(spec['length'] * 8 for spec in header['arrays'].values())
+
+def test_label_index_built_from_labeled_rows(model_data):
+    assert len(model_data.label_index) == 5
+    assert model_data.label_index.get('tim hortons #1234  toronto on') == 'Coffee'
+    assert model_data.label_index.get('TIM HORTONS #5555 TORONTO ON') is None
+
+def test_label_index_latest_label_wins():
+    label_index = LabelIndex()
+    label_index.update([('SHELL GAS', 'Gas'), ('NETFLIX', float('nan')), ('SHELL GAS', 'Car')])
+    assert label_index.get('Shell Gas') == 'Car'
+    assert 'NETFLIX' not in label_index
+
+def test_label_index_saved_with_meta_data(model_data):
+    loaded = ModelData(data_path='data.bin', meta_path='meta_data.pkl')
+    assert loaded.label_index.labels == model_data.label_index.labels
+
+def test_classify_data_asks_once_per_description(raw_data, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    raw_data = pd.concat([raw_data, raw_data.iloc[[0]]], ignore_index=True).drop(columns='Class')
+    prompts = []
+    responses = iter(['Coffee', 'Coffee', 'Gas', 'Gas', 'Subscriptions'])
+    monkeypatch.setattr('builtins.input', lambda msg: prompts.append(msg) or next(responses))
+    model_data = ModelData(raw_data)
+    assert len(prompts) == 5
+    assert '(x2)' in prompts[0]
+    assert model_data.raw_data['Class'].tolist() == ['Coffee', 'Coffee', 'Gas', 'Gas', 'Subscriptions', 'Coffee']
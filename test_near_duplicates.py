@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+from data import ModelData
+from labeling_queue import LabelingQueue
+from near_duplicates import NearDuplicateIndex, cluster_descriptions, cluster_key, propagate_labels, shingles
+
+
+@pytest.fixture
+def descriptions() -> list[str]:
+    return [
+        'TIM HORTONS #1234 TORONTO',
+        'NETFLIX.COM',
+        'TIM HORTONS #5678 OTTAWA',
+        'SHELL GAS STATION #44',
+        'tim hortons #0001',
+    ]
+
+
+def test_shingles_ignore_numbers():
+    assert shingles('Tim Hortons #1234') == {'TIM', 'HORTONS', 'TIM HORTONS', '^TIM', '^TIM HORTONS'}
+    assert shingles('#1234') == {'#1234'}
+
+def test_identical_keywords_share_a_signature():
+    index = NearDuplicateIndex()
+    assert (index.signature('TIM HORTONS #1') == index.signature('tim hortons #2')).all()
+
+def test_clusters_near_duplicates(descriptions):
+    clusters = cluster_descriptions(descriptions)
+    assert clusters[0] == clusters[2] == clusters[4]
+    assert len({clusters[0], clusters[1], clusters[3]}) == 3
+
+def test_different_merchants_in_the_same_city_stay_apart():
+    clusters = cluster_descriptions(['FOO SHOP TORONTO', 'BAR SHOP TORONTO'])
+    assert clusters[0] != clusters[1]
+
+def test_threshold(descriptions):
+    clusters = cluster_descriptions(descriptions, threshold=0.9)
+    assert clusters[0] != clusters[2]
+
+def test_propagate_labels(descriptions):
+    labels = ['Coffee', float('nan'), '', 'Gas', None]
+    assert propagate_labels(descriptions, labels)[1:] == [labels[1], 'Coffee', 'Gas', 'Coffee']
+
+def test_labeling_queue_groups_clusters(descriptions):
+    queue = LabelingQueue(descriptions, key=cluster_key(descriptions))
+    assert queue.label('Coffee') == [0, 2, 4]
+    assert len(queue) == 2
+
+def test_model_data_propagates_labels(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    raw_data = pd.DataFrame({
+        'Description': ['TIM HORTONS #1234 TORONTO ON', 'TIM HORTONS #99 TORONTO ON', 'SHELL GAS HALIFAX NS'],
+        'Class': ['Coffee', None, 'Gas'],
+    })
+    model_data = ModelData(raw_data, near_duplicates=True)
+    assert list(model_data.raw_data['Class']) == ['Coffee', 'Coffee', 'Gas']
+    assert model_data.class_names == ['Coffee', 'Gas']
+
+def test_model_data_drops_rows_left_unlabeled(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    raw_data = pd.DataFrame({
+        'Description': ['TIM HORTONS #1234 TORONTO ON', 'NETFLIX.COM', 'TIM HORTONS #99 TORONTO ON', 'SHELL GAS HALIFAX NS'],
+        'Class': ['Coffee', None, None, 'Gas'],
+    })
+    model_data = ModelData(raw_data, near_duplicates=True)
+    assert list(model_data.raw_data['Description']) == ['TIM HORTONS #1234 TORONTO ON', 'TIM HORTONS #99 TORONTO ON', 'SHELL GAS HALIFAX NS']
+    assert model_data.class_names == ['Coffee', 'Gas']
+    assert model_data.y.shape == (3, 2)
+    assert model_data.X.shape[0] == 3
+    assert 'NETFLIX.COM' not in model_data.label_index
@@ -0,0 +1,107 @@
+import os
+import sys
+import subprocess
+
+import numpy as np
+import pytest
+import torch
+
+from bundle import save_bundle
+from classifier import Classifier
+from data import ModelData
+from numpy_net import NumpyNet, top_k
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_forward_matches_torch(model):
+    X = torch.bernoulli(torch.full((20, 5), 0.4, dtype=torch.float32))
+    expected = model.predict(X).detach().numpy()
+    np.testing.assert_allclose(model.numpy_net().forward(X.numpy()), expected, atol=1e-6)
+
+def test_single_row_matches_torch(model):
+    X = torch.tensor([[1, 1, 0, 0, 0]], dtype=torch.float32)
+    probabilities = model.numpy_net().forward(X[0].numpy())
+    assert probabilities.shape == (3,)
+    np.testing.assert_allclose(probabilities, model.predict(X).detach().numpy()[0], atol=1e-6)
+
+def test_rows_match_dense(model):
+    net = model.numpy_net()
+    # the second row is empty
+    crow_indices, col_indices = [0, 2, 2, 5], [0, 1, 2, 3, 4]
+    X = np.zeros((3, 5), dtype=np.float32)
+    X[0, [0, 1]] = X[2, [2, 3, 4]] = 1
+    np.testing.assert_allclose(net.forward_rows(crow_indices, col_indices), net.forward(X), atol=1e-6)
+
+def test_predict_batch_matches_torch(model):
+    X = torch.bernoulli(torch.full((10, 5), 0.5, dtype=torch.float32))
+    confidences, indices = model.predict_batch(X, k=2, batch_size=3)
+    numpy_confidences, numpy_indices = model.numpy_net().predict_batch(X.numpy(), k=2, batch_size=3)
+    np.testing.assert_allclose(numpy_confidences, confidences.numpy(), atol=1e-6)
+    assert np.array_equal(numpy_indices, indices.numpy())
+
+def test_top_k_is_capped_at_classes():
+    confidences, indices = top_k(np.array([[0.2, 0.5, 0.3]]), 5)
+    assert indices.tolist() == [[1, 2, 0]]
+    assert confidences.tolist() == [[0.5, 0.3, 0.2]]
+
+def test_export_round_trip(model, tmp_path):
+    path = str(tmp_path / 'model.npz')
+    model.export_numpy(path)
+    loaded = NumpyNet.load(path)
+    X = np.eye(5, dtype=np.float32)
+    np.testing.assert_allclose(loaded.forward(X), model.predict(torch.from_numpy(X)).detach().numpy(), atol=1e-6)
+    assert (loaded.input_size, loaded.output_size) == (5, 3)
+
+def test_classifier_engines_agree(model, model_data, tmp_path):
+    path = str(tmp_path / 'model.blcb')
+    save_bundle(path, model, model_data)
+    descriptions = ['TIM HORTONS #123', 'SHELL GAS STATION', 'NETFLIX.COM', 'UNKNOWN']
+    expected = Classifier.from_bundle(path).predict(descriptions, k=2)
+    numpy_classifier = Classifier.from_bundle(path, engine='numpy')
+    predictions = numpy_classifier.predict(descriptions, k=2)
+    for row, expected_row in zip(predictions, expected):
+        assert [name for name, _ in row] == [name for name, _ in expected_row]
+        np.testing.assert_allclose([c for _, c in row], [c for _, c in expected_row], atol=1e-6)
+    # the weights were never loaded into torch
+    assert numpy_classifier._model is None
+
+def test_numpy_net_follows_model_updates(model, model_data):
+    classifier = Classifier(model_data, model, engine='numpy')
+    first = classifier.numpy_net
+    assert classifier.numpy_net is first
+    with torch.no_grad():
+        model.model.fc2.bias += 1
+    model._version = None
+    assert classifier.numpy_net is not first
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        Classifier(ModelData(), engine='onnx')
+
+def test_numpy_engine_does_not_import_torch(model, model_data, tmp_path):
+    path = str(tmp_path / 'model.blcb')
+    save_bundle(path, model, model_data)
+    code = (
+        'import sys; from classifier import Classifier; '
+        f'print(Classifier.from_bundle({path!r}, engine="numpy").predict(["SHELL GAS"])[0][0][0], "torch" in sys.modules)'
+    )
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.split()[-1] == 'False'
+
+def test_main_numpy_engine_does_not_import_torch(model, model_data, tmp_path):
+    bundle_path = str(tmp_path / 'model.blcb')
+    save_bundle(bundle_path, model, model_data)
+    statement_path = str(tmp_path / 'statement.csv')
+    with open(statement_path, 'w') as f:
+        f.write('Description\nSHELL GAS\nTIM HORTONS\n')
+    output_path = str(tmp_path / 'classified.csv')
+    code = (
+        'import sys, main; '
+        f'main.main(["--classify", {statement_path!r}, "--bundle", {bundle_path!r}, "--engine", "numpy", "--output", {output_path!r}]); '
+        'print("torch" in sys.modules)'
+    )
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.split()[-1] == 'False'
+    with open(output_path) as f:
+        assert len(f.read().splitlines()) == 3
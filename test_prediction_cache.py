@@ -0,0 +1,83 @@
+import pytest
+import torch
+
+from classifier import Classifier
+from data import normalize_description
+from prediction_cache import PredictionCache
+
+
+@pytest.fixture
+def cache() -> PredictionCache:
+    return PredictionCache(maxsize=2)
+
+@pytest.fixture
+def classifier(model_data, model) -> Classifier:
+    return Classifier(model_data, model, cache=PredictionCache())
+
+
+def test_normalize_description():
+    assert normalize_description('  Tim  Hortons #1234 ') == 'TIM HORTONS #1234'
+
+def test_get_normalizes_description(cache):
+    cache.put('v1', 'Tim Hortons', 1, [('Coffee', 0.9)])
+    assert cache.get('v1', 'TIM  HORTONS', 1) == [('Coffee', 0.9)]
+    assert cache.get('v1', 'TIM HORTONS', 2) is None
+
+def test_evicts_least_recently_used(cache):
+    cache.put('v1', 'a', 1, [('A', 1.0)])
+    cache.put('v1', 'b', 1, [('B', 1.0)])
+    cache.get('v1', 'a', 1)
+    cache.put('v1', 'c', 1, [('C', 1.0)])
+    assert cache.get('v1', 'b', 1) is None
+    assert cache.get('v1', 'a', 1) == [('A', 1.0)]
+    assert len(cache) == 2
+
+def test_new_model_version_invalidates(cache):
+    cache.put('v1', 'a', 1, [('A', 1.0)])
+    assert cache.get('v2', 'a', 1) is None
+    assert len(cache) == 0
+
+def test_stats(cache):
+    cache.put('v1', 'a', 1, [('A', 1.0)])
+    cache.get('v1', 'a', 1)
+    cache.get('v1', 'b', 1)
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'size': 1, 'maxsize': 2}
+
+def test_save_and_load(cache, tmp_path):
+    path = str(tmp_path / 'cache.pkl')
+    cache.put('v1', 'a', 1, [('A', 1.0)])
+    cache.save(path)
+    loaded = PredictionCache(path=path)
+    assert loaded.get('v1', 'a', 1) == [('A', 1.0)]
+
+def test_classifier_uses_cache(classifier):
+    descriptions = ['TIM HORTONS', 'tim hortons', 'SHELL GAS']
+    first = classifier.classify_many(descriptions)
+    assert classifier.cache.stats()['misses'] == 3
+    assert classifier.classify_many(descriptions) == first
+    assert classifier.cache.stats()['hits'] == 3
+
+def test_classifier_predicts_repeats_once(classifier, monkeypatch):
+    predicted = []
+    predict = classifier.predict
+    def recording_predict(descriptions, k=1):
+        predicted.extend(descriptions)
+        return predict(descriptions, k)
+    monkeypatch.setattr(classifier, 'predict', recording_predict)
+
+    descriptions = ['TIM HORTONS'] * 1000 + ['shell  gas'] * 999 + ['SHELL GAS']
+    results = classifier.classify_many(descriptions)
+    assert predicted == ['TIM HORTONS', 'shell  gas']
+    assert results[:1000] == [results[0]] * 1000
+    assert results[1000:] == [results[1000]] * 1000
+    assert len(classifier.cache) == 2
+
+def test_classifier_cache_invalidates_after_training(classifier):
+    classifier.classify_many(['TIM HORTONS'])
+    version = classifier.model_version
+    X = classifier.model_data.transform(['TIM HORTONS', 'SHELL GAS'] * 4).to_dense()
+    y = torch.tensor([[1, 0, 0], [0, 1, 0]] * 4, dtype=torch.float)
+    classifier.model.train(X, y, epochs=2, learning_rate=1e-2, seed=0)
+    assert classifier.model_version != version
+    classifier.classify_many(['TIM HORTONS'])
+    assert classifier.cache.stats()['hits'] == 0
@@ -0,0 +1,156 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pytest
+
+httplib2 = pytest.importorskip('httplib2')
+pytest.importorskip('googleapiclient')
+
+from sheets import SheetsClient, offset_range
+from sheets_cache import SheetsCache
+
+
+class FakeSheets(BaseHTTPRequestHandler):
+    """Answers batchGet from a dict of ranges and records batchUpdate bodies."""
+    values = {}
+    version = '1'
+    updates = []
+    failures = 0
+    requests = 0
+
+    def reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def fail_if_asked(self) -> bool:
+        type(self).requests += 1
+        if type(self).failures:
+            type(self).failures -= 1
+            self.reply(503, {'error': {'code': 503, 'message': 'try again'}})
+            return True
+        return False
+
+    def do_GET(self):
+        if self.fail_if_asked():
+            return
+        url = urlparse(self.path)
+        if url.path.startswith('/files/'):
+            self.reply(200, {'version': self.version})
+            return
+        assert url.path.endswith('/values:batchGet')
+        ranges = parse_qs(url.query)['ranges']
+        self.reply(200, {'valueRanges': [{'range': r, 'values': self.values.get(r, [])} for r in ranges]})
+
+    def do_POST(self):
+        if self.fail_if_asked():
+            return
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.updates.append(body)
+        cells = sum(len(row) for data in body['data'] for row in data['values'])
+        self.reply(200, {'totalUpdatedCells': cells})
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    FakeSheets.values = {'October Groceries!B28:C29': [['Milk', '4.99'], ['Eggs', '3.49']], 'Rent!A1': [['1200']]}
+    FakeSheets.version = '1'
+    FakeSheets.updates = []
+    FakeSheets.failures = 0
+    FakeSheets.requests = 0
+    server = HTTPServer(('127.0.0.1', 0), FakeSheets)
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.01}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+
+@pytest.fixture
+def client(server) -> SheetsClient:
+    return SheetsClient(http=httplib2.Http(), api_endpoint=f'http://127.0.0.1:{server.server_port}/', backoff=0.01)
+
+
+def test_offset_range():
+    assert offset_range("'October Groceries'!B28:C29", 10) == "'October Groceries'!B38"
+    assert offset_range('A1', 2) == 'A3'
+    with pytest.raises(ValueError):
+        offset_range('Totals', 1)
+
+def test_batch_get_reads_every_range_in_one_request(client):
+    values = client.batch_get('sheet', ['October Groceries!B28:C29', 'Rent!A1', 'Empty!A1'])
+    assert values == {'October Groceries!B28:C29': [['Milk', '4.99'], ['Eggs', '3.49']], 'Rent!A1': [['1200']], 'Empty!A1': []}
+    assert FakeSheets.requests == 1
+
+def test_retries_transient_errors(client):
+    FakeSheets.failures = 2
+    assert client.get_values('sheet', 'Rent!A1') == [['1200']]
+    assert FakeSheets.requests == 3
+
+def test_gives_up_after_retries(client):
+    from googleapiclient.errors import HttpError
+    FakeSheets.failures = 10
+    client.retries = 1
+    with pytest.raises(HttpError):
+        client.get_values('sheet', 'Rent!A1')
+
+def test_batch_update_is_chunked(client):
+    client.max_cells = 4
+    rows = [[str(i), 'Coffee'] for i in range(5)]
+    assert client.batch_update('sheet', {'Classified!A1': rows, 'Totals!A1': [['Coffee', 10]]}) == 12
+    ranges = [[data['range'] for data in body['data']] for body in FakeSheets.updates]
+    assert ranges == [['Classified!A1'], ['Classified!A3'], ['Classified!A5', 'Totals!A1']]
+
+def test_write_classifications(client):
+    frame = pd.DataFrame({
+        'Description': ['TIM HORTONS', 'SHELL', 'TIMS'],
+        'Transaction Amount': [2.5, 40.0, 1.5],
+        'Class': ['Coffee', 'Gas', 'Coffee'],
+        'Confidence': [0.9, 0.8, float('nan')],
+    })
+    client.write_classifications('sheet', frame)
+    assert len(FakeSheets.updates) == 1
+    classified, totals = FakeSheets.updates[0]['data']
+    assert classified['values'][0] == ['Description', 'Transaction Amount', 'Class', 'Confidence']
+    assert classified['values'][3] == ['TIMS', 1.5, 'Coffee', '']
+    assert totals == {'range': 'Totals!A1', 'values': [['Class', 'Transaction Amount'], ['Coffee', 4.0], ['Gas', 40.0]]}
+
+def test_cached_ranges_are_reused_until_the_revision_changes(server, tmp_path):
+    path = str(tmp_path / 'sheets_cache.pkl')
+    endpoint = f'http://127.0.0.1:{server.server_port}/'
+    client = SheetsClient(http=httplib2.Http(), api_endpoint=endpoint, backoff=0.01, cache=SheetsCache(path))
+    client.batch_get('sheet', ['Rent!A1'])
+    assert FakeSheets.requests == 2
+
+    # a later run only checks the revision, and fetches just the range it has not seen
+    client = SheetsClient(http=httplib2.Http(), api_endpoint=endpoint, backoff=0.01, cache=SheetsCache(path))
+    values = client.batch_get('sheet', ['Rent!A1', 'October Groceries!B28:C29'])
+    assert values['Rent!A1'] == [['1200']]
+    assert FakeSheets.requests == 4
+    assert client.cache.stats()['hits'] == 1
+
+    FakeSheets.values['Rent!A1'] = [['1300']]
+    FakeSheets.version = '2'
+    assert client.get_values('sheet', 'Rent!A1') == [['1300']]
+
+def test_recent_revision_checks_are_trusted(server):
+    client = SheetsClient(http=httplib2.Http(), api_endpoint=f'http://127.0.0.1:{server.server_port}/',
+                          backoff=0.01, cache=SheetsCache(), revision_max_age=60)
+    client.get_values('sheet', 'Rent!A1')
+    requests = FakeSheets.requests
+    assert client.get_values('sheet', 'Rent!A1') == [['1200']]
+    assert FakeSheets.requests == requests
+
+def test_writes_invalidate_the_cache(server):
+    client = SheetsClient(http=httplib2.Http(), api_endpoint=f'http://127.0.0.1:{server.server_port}/',
+                          backoff=0.01, cache=SheetsCache(), revision_max_age=60)
+    client.get_values('sheet', 'Rent!A1')
+    client.batch_update('sheet', {'Rent!A1': [['1300']]})
+    assert len(client.cache) == 0
@@ -0,0 +1,29 @@
+from sheets_cache import SheetsCache
+
+
+def test_entries_are_tied_to_a_revision():
+    cache = SheetsCache()
+    cache.put('sheet', 'Rent!A1', '1', [['1200']])
+    assert cache.get('sheet', 'Rent!A1', '1') == [['1200']]
+    assert cache.get('sheet', 'Rent!A1', '2') is None
+    assert cache.get('sheet', 'Other!A1', '1') is None
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'stale': 1, 'hit_rate': 1 / 3, 'revision_checks': 0, 'size': 1}
+
+def test_new_revision_drops_older_entries():
+    cache = SheetsCache()
+    cache.put('sheet', 'Rent!A1', '1', [['1200']])
+    cache.put('other', 'Rent!A1', '1', [['900']])
+    cache.set_revision('sheet', '2')
+    assert len(cache) == 1
+    assert cache.revision('sheet', max_age=60) == '2'
+    assert cache.revision('sheet', max_age=0) is None
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / 'sheets_cache.pkl')
+    cache = SheetsCache(path)
+    cache.set_revision('sheet', '1')
+    cache.put('sheet', 'Rent!A1', '1', [['1200']])
+    cache.save()
+    loaded = SheetsCache(path)
+    assert loaded.get('sheet', 'Rent!A1', '1') == [['1200']]
+    assert loaded.revision('sheet', max_age=60) == '1'
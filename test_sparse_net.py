@@ -0,0 +1,95 @@
+import pytest
+import torch
+
+from bundle import save_bundle
+from classifier import Classifier
+from model import Model
+from net import Net, SparseNet, dense_to_bags
+
+
+@pytest.fixture
+def net() -> Net:
+    torch.manual_seed(0)
+    return Net(5, 8, 3)
+
+@pytest.fixture
+def X() -> torch.Tensor:
+    # the last row is empty
+    return torch.tensor([[1, 1, 0, 0, 0], [0, 0, 1, 1, 1], [0, 0, 0, 1, 0], [0, 0, 0, 0, 0]], dtype=torch.float)
+
+
+def test_dense_to_bags(X):
+    ids, offsets, weights = dense_to_bags(X)
+    assert ids.tolist() == [0, 1, 2, 3, 4, 3]
+    assert offsets.tolist() == [0, 2, 5, 6]
+    assert weights.tolist() == [1] * 6
+
+def test_sparse_net_matches_net(net, X):
+    sparse_net = SparseNet.from_net(net)
+    ids, offsets, _ = dense_to_bags(X)
+    assert torch.allclose(sparse_net(ids, offsets), net(X), atol=1e-6)
+    assert torch.allclose(sparse_net.forward_dense(X * 2), net(X * 2), atol=1e-6)
+
+def test_round_trip(net):
+    restored = SparseNet.from_net(net).to_net()
+    for name, tensor in net.state_dict().items():
+        assert torch.equal(restored.state_dict()[name], tensor)
+
+def test_sparse_model_saves_as_net(net, tmp_path):
+    path = str(tmp_path / 'model.pth')
+    torch.save(net.state_dict(), path)
+    dense = Model(model_path=path, input_size=5, hidden_size=8, output_size=3)
+    sparse = Model(model_path=path, input_size=5, hidden_size=8, output_size=3, sparse=True)
+    assert isinstance(sparse.model, SparseNet)
+    assert sparse.version == dense.version
+    sparse.save(path)
+    assert set(torch.load(path)) == {'fc1.weight', 'fc1.bias', 'fc2.weight', 'fc2.bias'}
+
+def test_predict_rows_matches_predict_batch(X):
+    crow_indices, col_indices = [0, 2, 5, 6, 6], [0, 1, 2, 3, 4, 3]
+    for sparse in (False, True):
+        model = Model(model_path='', input_size=5, hidden_size=8, output_size=3, sparse=sparse)
+        expected = model.predict_batch(X, k=2, batch_size=3)
+        confidences, indices = model.predict_rows(crow_indices, col_indices, k=2, batch_size=3)
+        assert torch.allclose(confidences, expected[0], atol=1e-6)
+        assert torch.equal(indices, expected[1])
+
+def test_transform_bags(model_data):
+    ids, offsets = model_data.transform_bags(['TIM HORTONS', 'UNKNOWN', 'SHELL GAS'])
+    assert ids.tolist() == [0, 1, 2, 3]
+    assert offsets.tolist() == [0, 2, 2]
+
+def test_sparse_model_trains_and_expands(X):
+    torch.manual_seed(0)
+    model = Model(model_path='', input_size=5, hidden_size=8, output_size=3, sparse=True)
+    y = torch.eye(3)[[0, 1, 2, 0]]
+    model.train(X, y, epochs=300, patience=300, validation_split=0.0, seed=0)
+    assert model.predict(X[:3]).argmax(dim=1).tolist() == [0, 1, 2]
+    before = model.predict(X).detach()
+    model.expand(7, 3)
+    assert isinstance(model.model, SparseNet)
+    assert torch.allclose(model.predict(torch.cat([X, torch.ones(len(X), 2)], dim=1)), before, atol=1e-6)
+
+@pytest.mark.parametrize('dtype', ['int8', 'float16'])
+def test_quantized_sparse_model(X, dtype):
+    model = Model(model_path='', input_size=5, hidden_size=8, output_size=3, sparse=True)
+    quantized = model.quantize(dtype)
+    report = model.compare_quantized(quantized, X, model.predict(X).argmax(dim=1))
+    assert report.agreement == 1.0
+    confidences, _ = quantized.predict_rows([0, 2, 5, 6, 6], [0, 1, 2, 3, 4, 3], k=1)
+    assert confidences.shape == (4, 1)
+
+def test_classifier_sparse_engine(model, model_data, tmp_path):
+    path = str(tmp_path / 'model.blcb')
+    save_bundle(path, model, model_data)
+    descriptions = ['TIM HORTONS #123', 'SHELL GAS STATION', 'NETFLIX.COM', 'UNKNOWN']
+    expected = Classifier.from_bundle(path).predict(descriptions, k=2)
+    classifier = Classifier.from_bundle(path, engine='sparse')
+    predictions = classifier.predict(descriptions, k=2)
+    assert classifier.model.sparse
+    assert classifier.model_version == Classifier.from_bundle(path).model.version
+    for row, expected_row in zip(predictions, expected):
+        assert [name for name, _ in row] == [name for name, _ in expected_row]
+        assert [c for _, c in row] == pytest.approx([c for _, c in expected_row], abs=1e-6)
+    with pytest.raises(ValueError):
+        Classifier(model_data, model, engine='sparse')
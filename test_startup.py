@@ -0,0 +1,33 @@
+import os
+import sys
+import time
+import subprocess
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# wall time allowed for `python main.py --help`, interpreter startup included
+STARTUP_BUDGET_SECONDS = 0.5
+
+HEAVY_MODULES = ['torch', 'pandas', 'numpy', 'readline']
+
+
+def run_python(*args) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], cwd=ROOT, capture_output=True, text=True, check=True)
+
+
+def test_main_help_within_budget():
+    # best of a few runs, so a busy machine does not fail the budget
+    timings = []
+    for _ in range(3):
+        start = time.perf_counter()
+        run_python('main.py', '--help')
+        timings.append(time.perf_counter() - start)
+    assert min(timings) < STARTUP_BUDGET_SECONDS
+
+def test_imports_defer_heavy_modules():
+    result = run_python('-c', f'import sys, main, data, log, bundle, classifier; print([m for m in {HEAVY_MODULES!r} if m in sys.modules])')
+    assert result.stdout.strip() == '[]'
+
+def test_log_import_does_no_filesystem_work(tmp_path):
+    subprocess.run([sys.executable, '-c', f'import sys; sys.path.insert(0, {ROOT!r}); import log'], cwd=tmp_path, check=True)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,39 @@
+from virtual_listbox import ListWindow
+
+
+def test_rows_and_fractions():
+    window = ListWindow(50000, 20)
+    assert window.rows() == range(0, 20)
+    assert window.fractions() == (0.0, 20 / 50000)
+
+def test_moveto_stays_inside_the_list():
+    window = ListWindow(50000, 20)
+    window.moveto(0.5)
+    assert window.rows() == range(25000, 25020)
+    window.moveto(1.0)
+    assert window.rows() == range(49980, 50000)
+    assert window.fractions()[1] == 1.0
+
+def test_scroll_units_and_pages():
+    window = ListWindow(100, 10)
+    window.scroll(3)
+    assert window.top == 3
+    window.scroll(2, 'pages')
+    assert window.top == 23
+    window.scroll(-5, 'pages')
+    assert window.top == 0
+
+def test_see_scrolls_as_little_as_possible():
+    window = ListWindow(100, 10)
+    window.see(5)
+    assert window.top == 0
+    window.see(15)
+    assert window.rows() == range(6, 16)
+    window.see(2)
+    assert window.top == 2
+
+def test_short_and_empty_lists():
+    window = ListWindow(3, 10)
+    window.scroll(5)
+    assert window.rows() == range(0, 3)
+    assert ListWindow(0, 10).fractions() == (0.0, 1.0)
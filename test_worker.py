@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from worker import TaskRunner
+
+
+@pytest.fixture
+def runner():
+    runner = TaskRunner()
+    yield runner
+    runner.shutdown()
+
+def wait(runner, task):
+    task.future.result(timeout=5)
+    runner.poll()
+
+
+def test_callbacks_run_on_the_polling_thread(runner):
+    threads = []
+    progress = []
+    results = []
+
+    def work(task, n):
+        threads.append(threading.get_ident())
+        for i in range(n):
+            task.progress(i)
+        return n
+
+    task = runner.submit(work, 3, on_progress=progress.append, on_done=results.append)
+    wait(runner, task)
+    assert threads[0] != threading.get_ident()
+    assert progress == [0, 1, 2]
+    assert results == [3]
+    assert runner.tasks == []
+
+def test_errors_go_to_on_error(runner):
+    errors = []
+
+    def fail(task):
+        raise ValueError('bad statement')
+
+    task = runner.submit(fail, on_error=errors.append)
+    wait(runner, task)
+    assert isinstance(errors[0], ValueError)
+
+def test_cancelled_tasks_stop_and_are_not_delivered(runner):
+    started = threading.Event()
+    release = threading.Event()
+    results = []
+
+    def work(task):
+        started.set()
+        release.wait(5)
+        return task.cancelled()
+
+    task = runner.submit(work, on_done=results.append)
+    queued = runner.submit(work, on_done=results.append)
+    started.wait(5)
+    task.cancel()
+    queued.cancel()
+    release.set()
+    task.future.result(timeout=5)
+    runner.poll()
+    assert task.cancelled() and queued.future.cancelled()
+    assert results == []
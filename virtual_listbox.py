@@ -0,0 +1,171 @@
+# a listbox for statements with tens of thousands of rows: only the rows that fit on screen
+# are ever inserted into Tk, and scrolling pages the next ones in from the underlying data
+from __future__ import annotations
+
+import tkinter
+import tkinter.font
+from tkinter import ttk
+from typing import Callable, Sequence, Union
+
+
+class ListWindow:
+    """The range of rows of a list of length rows that is on screen, visible rows at a time."""
+
+    def __init__(self, length: int = 0, visible: int = 1):
+        """Initialize the ListWindow class."""
+        self.length = length
+        self.visible = max(visible, 1)
+        self.top = 0
+
+    def clamp(self):
+        """Keep the window inside the list, showing as many rows as possible."""
+        self.top = max(0, min(self.top, self.length - self.visible))
+
+    def rows(self) -> range:
+        """Return the indices of the rows on screen."""
+        return range(self.top, min(self.top + self.visible, self.length))
+
+    def fractions(self) -> tuple[float, float]:
+        """Return the first and last visible fractions of the list, as a scrollbar expects."""
+        if self.length == 0:
+            return 0.0, 1.0
+        return self.top / self.length, min(self.top + self.visible, self.length) / self.length
+
+    def moveto(self, fraction: float):
+        """Put the row at fraction of the list at the top."""
+        self.top = int(fraction * self.length)
+        self.clamp()
+
+    def scroll(self, number: int, what: str = 'units'):
+        """Scroll by number rows, or by number screens if what is 'pages'."""
+        self.top += number * (self.visible if what == 'pages' else 1)
+        self.clamp()
+
+    def see(self, index: int):
+        """Scroll as little as possible to show the row at index."""
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self.visible:
+            self.top = index - self.visible + 1
+        self.clamp()
+
+
+class VirtualListbox(ttk.Frame):
+    """A scrollable list of the rows of data that only materializes the visible ones.
+
+    data can be any sequence, such as a list or a view over a DataFrame column; it is only
+    read with len() and indexing, and refresh() picks up rows added to it since. format
+    turns a row into the text shown. Selecting a row generates <<ListboxSelect>> and
+    curselection() returns indices into data.
+    """
+
+    def __init__(self, root: Union[ttk.Widget, None] = None, data: Sequence = (), format: Callable = str,
+                 height: int = 20, **kwargs):
+        """Initialize the VirtualListbox class."""
+        super().__init__(root)
+        self.data = data
+        self.format = format
+        self.window = ListWindow(len(data), height)
+        self.selected = None
+
+        self.listbox = tkinter.Listbox(self, height=height, exportselection=False, **kwargs)
+        self.scrollbar = ttk.Scrollbar(self, orient=tkinter.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tkinter.RIGHT, fill=tkinter.Y)
+        self.listbox.pack(side=tkinter.LEFT, fill=tkinter.BOTH, expand=True)
+
+        self.listbox.bind('<Configure>', self.resized)
+        self.listbox.bind('<<ListboxSelect>>', self.selection_changed)
+        self.listbox.bind('<MouseWheel>', self.wheel)
+        self.listbox.bind('<Button-4>', lambda event: self.yview('scroll', -3, 'units'))
+        self.listbox.bind('<Button-5>', lambda event: self.yview('scroll', 3, 'units'))
+        self.listbox.bind('<Up>', lambda event: self.move_selection(-1))
+        self.listbox.bind('<Down>', lambda event: self.move_selection(1))
+        self.listbox.bind('<Prior>', lambda event: self.yview('scroll', -1, 'pages'))
+        self.listbox.bind('<Next>', lambda event: self.yview('scroll', 1, 'pages'))
+
+        self.render()
+
+    def set_data(self, data: Sequence):
+        """Show the rows of data instead, from the top."""
+        self.data = data
+        self.selected = None
+        self.window.top = 0
+        self.refresh()
+
+    def refresh(self):
+        """Redraw the visible rows, after rows of data were added or changed."""
+        self.window.length = len(self.data)
+        self.window.clamp()
+        self.render()
+
+    def render(self):
+        """Replace the listbox contents with the rows in the window."""
+        rows = self.window.rows()
+        self.listbox.delete(0, tkinter.END)
+        self.listbox.insert(tkinter.END, *(self.format(self.data[index]) for index in rows))
+        if self.selected in rows:
+            self.listbox.selection_set(self.selected - rows.start)
+        self.scrollbar.set(*self.window.fractions())
+
+    def yview(self, *args):
+        """Scroll like Listbox.yview, by 'moveto' fraction or 'scroll' number units/pages."""
+        if args and args[0] == 'moveto':
+            self.window.moveto(float(args[1]))
+        elif args and args[0] == 'scroll':
+            self.window.scroll(int(args[1]), args[2])
+        else:
+            return self.window.fractions()
+        self.render()
+
+    def wheel(self, event):
+        self.yview('scroll', -1 if event.delta > 0 else 1, 'units')
+        return 'break'
+
+    def resized(self, event):
+        # fit as many rows as the listbox is tall now
+        line_height = tkinter.font.Font(font=self.listbox['font']).metrics('linespace') + 2 * int(self.listbox['selectborderwidth'])
+        visible = max(event.height // max(line_height, 1), 1)
+        if visible != self.window.visible:
+            self.window.visible = visible
+            self.window.clamp()
+            self.render()
+
+    def selection_changed(self, event):
+        selection = self.listbox.curselection()
+        if selection:
+            self.selected = self.window.top + selection[0]
+            self.event_generate('<<ListboxSelect>>')
+
+    def move_selection(self, step: int):
+        """Select the row step rows away from the selected one, scrolling to keep it visible."""
+        if not len(self.data):
+            return 'break'
+        index = 0 if self.selected is None else min(max(self.selected + step, 0), len(self.data) - 1)
+        self.see(index)
+        self.selection_set(index)
+        self.event_generate('<<ListboxSelect>>')
+        return 'break'
+
+    def see(self, index: int):
+        """Scroll so the row at index is visible."""
+        self.window.see(index)
+        self.render()
+
+    def selection_set(self, index: int):
+        """Select the row at index of data."""
+        self.selected = index
+        self.listbox.selection_clear(0, tkinter.END)
+        if index in self.window.rows():
+            self.listbox.selection_set(index - self.window.top)
+
+    def curselection(self) -> tuple[int, ...]:
+        """Return the index into data of the selected row, like Listbox.curselection."""
+        return () if self.selected is None else (self.selected,)
+
+    def get(self, index: int) -> str:
+        """Return the text shown for the row at index of data."""
+        return self.format(self.data[index])
+
+    def size(self) -> int:
+        """Return the number of rows of data."""
+        return len(self.data)
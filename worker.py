@@ -0,0 +1,128 @@
+# run long operations (reading statements, training, predicting) off the Tk main thread
+# results, progress and errors come back through a queue that the window polls with after(),
+# since tkinter widgets may only be touched from the thread running mainloop
+from __future__ import annotations
+
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+from log import logger
+
+
+class Task:
+    """A handle on work submitted to a TaskRunner.
+
+    The work function receives its Task as the first argument, reports progress with
+    progress() and should return early once cancelled() is True."""
+
+    def __init__(self, runner: TaskRunner, on_done: Callable = None, on_progress: Callable = None,
+                 on_error: Callable = None):
+        """Initialize the Task class."""
+        self.runner = runner
+        self.on_done = on_done
+        self.on_progress = on_progress
+        self.on_error = on_error
+        self.future: Future | None = None
+        self._cancelled = threading.Event()
+
+    def progress(self, value):
+        """Send value to on_progress on the main thread. Called from the worker."""
+        self.runner.events.put((self, 'progress', value))
+
+    def cancel(self):
+        """Ask the task to stop; it is dropped without running if it has not started yet."""
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def cancelled(self) -> bool:
+        """Return True once the task has been asked to stop."""
+        return self._cancelled.is_set()
+
+    def done(self) -> bool:
+        """Return True once the work function has returned, failed or been dropped."""
+        return self.future is not None and self.future.done()
+
+
+class TaskRunner:
+    """A pool of worker threads whose callbacks run on the Tk main thread.
+
+    Callbacks are delivered by poll(), which reschedules itself on widget with after() while
+    any task is unfinished. Without a widget, poll() has to be called by hand."""
+
+    def __init__(self, widget=None, max_workers: int = 1, poll_ms: int = 50):
+        """Initialize the TaskRunner class."""
+        self.widget = widget
+        self.poll_ms = poll_ms
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='worker')
+        self.events = queue.Queue()
+        self.tasks: list[Task] = []
+        self._scheduled = None
+
+    def submit(self, function: Callable, *args, on_done: Callable = None, on_progress: Callable = None,
+               on_error: Callable = None, **kwargs) -> Task:
+        """Run function(task, *args, **kwargs) on a worker thread.
+
+        on_done receives the return value, on_progress each progress() value and on_error
+        the exception raised; all three run on the main thread, and none of them after the
+        task is cancelled.
+
+        Returns: task (Task)"""
+        task = Task(self, on_done, on_progress, on_error)
+
+        def run():
+            try:
+                result = function(task, *args, **kwargs)
+            except Exception as error:
+                self.events.put((task, 'error', error))
+            else:
+                self.events.put((task, 'done', result))
+
+        task.future = self.executor.submit(run)
+        self.tasks.append(task)
+        self._schedule()
+        return task
+
+    def _schedule(self):
+        if self.widget is not None and self._scheduled is None:
+            self._scheduled = self.widget.after(self.poll_ms, self.poll)
+
+    def poll(self) -> int:
+        """Deliver the queued events of every task to its callbacks.
+
+        Returns: delivered (int), the number of events handled"""
+        self._scheduled = None
+        delivered = 0
+        while True:
+            try:
+                task, kind, value = self.events.get_nowait()
+            except queue.Empty:
+                break
+            delivered += 1
+            if task.cancelled():
+                continue
+            callback = {'progress': task.on_progress, 'done': task.on_done, 'error': task.on_error}[kind]
+            if callback is not None:
+                callback(value)
+            elif kind == 'error':
+                logger.error(f'Background task failed: {value!r}')
+
+        self.tasks = [task for task in self.tasks if not task.done()]
+        if self.tasks or not self.events.empty():
+            self._schedule()
+        return delivered
+
+    def cancel_all(self):
+        """Cancel every unfinished task."""
+        for task in self.tasks:
+            task.cancel()
+
+    def shutdown(self):
+        """Cancel every task and stop the worker threads without waiting for them."""
+        self.cancel_all()
+        if self._scheduled is not None and self.widget is not None:
+            self.widget.after_cancel(self._scheduled)
+            self._scheduled = None
+        self.executor.shutdown(wait=False, cancel_futures=True)